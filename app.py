@@ -2,6 +2,9 @@ import streamlit as st
 import requests
 import json
 import os
+import itertools
+import threading
+from collections import OrderedDict
 
 st.set_page_config(page_title="Monday.com Founder BI", page_icon="📈", layout="centered")
 
@@ -80,7 +83,11 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-API_URL = os.environ.get("FASTAPI_URL", "http://localhost:8000") + "/api/chat"
+BASE_URL = os.environ.get("FASTAPI_URL", "http://localhost:8000")
+API_URL = BASE_URL + "/api/chat"
+STREAM_URL = API_URL + "/stream"
+# Selects the account: the backend serves the tenant this token belongs to.
+API_TOKEN = os.environ.get("BI_API_TOKEN")
 
 st.title("📈 Founder BI Agent")
 st.markdown("<p style='color: #8b949e; font-size: 1.1rem; margin-bottom: 2rem;'>Real-time executive insights powered by Monday.com and Gemini.</p>", unsafe_allow_html=True)
@@ -88,66 +95,60 @@ st.markdown("<p style='color: #8b949e; font-size: 1.1rem; margin-bottom: 2rem;'>
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-def display_message(role, msg_type, content, index=0):
-    with st.chat_message(role):
-        if msg_type == "report":
-            st.markdown(f"<h2 style='color: #fff; margin-bottom: 20px;'>{content['title']}</h2>", unsafe_allow_html=True)
-            
-            # Use columns and metrics for a dashboard feel
-            st.markdown("### 💰 Financial Health")
-            
-            try:
-                # Parse the strings back to numbers if needed, or extract from raw data if available. 
-                # Since report_generator sends formatted strings, we'll display them beautifully.
-                rev_text = content['revenue_summary'].split('|')[0].replace('Closed Revenue: ', '').strip()
-                win_rate = content['revenue_summary'].split('|')[1].replace('Win Rate: ', '').strip() if '|' in content['revenue_summary'] else 'N/A'
-                pipe_text = content['pipeline_health'].replace('Open Pipeline: ', '').strip()
-                
-                m1, m2, m3 = st.columns(3)
-                m1.metric("Closed Revenue", rev_text)
-                m2.metric("Open Pipeline", pipe_text)
-                m3.metric("Win Rate", win_rate)
-            except Exception:
-                st.info(content['revenue_summary'])
-                st.info(content['pipeline_health'])
-
-            st.markdown("---")
-            
-            c1, c2 = st.columns([1.5, 1])
-            with c1:
-                st.markdown("### 🏢 Sector Breakdown")
-                sectors = content.get('sector_breakdown', {})
-                if sectors:
-                    table_html = "<table class='sector-table'><tr><th>Sector</th><th>Revenue Generated</th></tr>"
-                    # Sort by highest revenue
-                    sorted_sectors = sorted(sectors.items(), key=lambda x: x[1], reverse=True)
-                    for s_name, s_val in sorted_sectors:
-                        name = s_name if s_name.strip() else "Uncategorized"
-                        table_html += f"<tr><td>{name}</td><td>${s_val:,.2f}</td></tr>"
-                    table_html += "</table>"
-                    st.markdown(table_html, unsafe_allow_html=True)
-                else:
-                    st.write("No sector data available.")
-                    
-            with c2:
-                st.markdown("### ⚙ Operations")
-                try:
-                    active = content['operational_status'].split('|')[0].replace('Active Projects: ', '').strip()
-                    delayed = content['operational_status'].split('|')[1].replace('Delayed Projects: ', '').strip()
-                    st.metric("Running Projects", active)
-                    st.metric("Delayed Ops", delayed, delta="- Attention Required" if int(delayed) > 0 else "On Track", delta_color="inverse")
-                except:
-                    st.info(content['operational_status'])
-                    
-                st.markdown("### 🚨 Risks")
-                for flag in content['risk_flags']:
-                    if "No critical" in flag:
-                        st.success(flag)
-                    else:
-                        st.error(flag)
-
-            st.markdown("---")
-            report_md = f"""# {content['title']}
+@st.cache_resource
+def get_session():
+    """One pooled HTTP session per server process, so questions reuse open connections."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if API_TOKEN:
+        session.headers["Authorization"] = f"Bearer {API_TOKEN}"
+    return session
+
+class AnswerCache:
+    """Backend answers with their ETags, keyed by normalized query, least recently used first out."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._answers = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query):
+        return " ".join(query.lower().split())
+
+    def get(self, query):
+        """Return (etag, answer) or None."""
+        with self._lock:
+            key = self.key(query)
+            if key in self._answers:
+                self._answers.move_to_end(key)
+                return self._answers[key]
+        return None
+
+    def put(self, query, etag, answer):
+        with self._lock:
+            self._answers[self.key(query)] = (etag, answer)
+            while len(self._answers) > self.max_entries:
+                self._answers.popitem(last=False)
+
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache()
+
+def sector_table_html(sectors):
+    table_html = "<table class='sector-table'><tr><th>Sector</th><th>Revenue Generated</th></tr>"
+    # Sort by highest revenue
+    sorted_sectors = sorted(sectors.items(), key=lambda x: x[1], reverse=True)
+    for s_name, s_val in sorted_sectors:
+        name = s_name if s_name.strip() else "Uncategorized"
+        table_html += f"<tr><td>{name}</td><td>${s_val:,.2f}</td></tr>"
+    table_html += "</table>"
+    return table_html
+
+def report_markdown(content):
+    return f"""# {content['title']}
 ## Revenue Summary
 {content['revenue_summary']}
 
@@ -159,34 +160,201 @@ def display_message(role, msg_type, content, index=0):
 
 ## Risk Flags
 """ + "\n".join([f"- {flag}" for flag in content['risk_flags']])
-            st.download_button("📩 Download PDF/Markdown", report_md, file_name="leadership_update.md", mime="text/markdown", key=f"download_report_{index}")
+
+def build_fragments(msg_type, content):
+    """Pre-build the expensive HTML/markdown pieces of a report once, so re-renders just reuse them."""
+    if msg_type != "report":
+        return None
+    return {"sector_table": sector_table_html(content.get('sector_breakdown') or {}), "report_md": report_markdown(content)}
+
+def report_layout():
+    """Lay out the report skeleton and return placeholders that sections are rendered into."""
+    slots = {"title": st.empty()}
+
+    # Use columns and metrics for a dashboard feel
+    st.markdown("### 💰 Financial Health")
+    slots["financial"] = st.empty()
+    st.markdown("---")
+
+    c1, c2 = st.columns([1.5, 1])
+    with c1:
+        st.markdown("### 🏢 Sector Breakdown")
+        slots["sector_breakdown"] = st.empty()
+    with c2:
+        st.markdown("### ⚙ Operations")
+        slots["operational_status"] = st.empty()
+        st.markdown("### 🚨 Risks")
+        slots["risk_flags"] = st.empty()
+
+    st.markdown("---")
+    slots["download"] = st.empty()
+    slots["data_quality_warnings"] = st.empty()
+    return slots
+
+def render_report_section(slots, content, name, fragments=None):
+    """Render one section of a (possibly partial) report into its placeholder."""
+    if name == "title":
+        slots["title"].markdown(f"<h2 style='color: #fff; margin-bottom: 20px;'>{content['title']}</h2>", unsafe_allow_html=True)
+
+    elif name == "metrics":
+        render_report_section(slots, content, "revenue_summary")
+        render_report_section(slots, content, "operational_status")
+
+    elif name in ("revenue_summary", "pipeline_health"):
+        with slots["financial"].container():
+            metrics = content.get('metrics')
+            if metrics:
+                m1, m2, m3 = st.columns(3)
+                m1.metric("Closed Revenue", f"${metrics['closed_revenue']:,.2f}")
+                m2.metric("Open Pipeline", f"${metrics['open_pipeline_value']:,.2f}")
+                m3.metric("Win Rate", f"{metrics['win_rate']:.1%}")
+                return
+            try:
+                # Until the numeric metrics section arrives, parse the display strings.
+                revenue_summary = content.get('revenue_summary', 'Closed Revenue: … | Win Rate: …')
+                rev_text = revenue_summary.split('|')[0].replace('Closed Revenue: ', '').strip()
+                win_rate = revenue_summary.split('|')[1].replace('Win Rate: ', '').strip() if '|' in revenue_summary else 'N/A'
+                pipe_text = content.get('pipeline_health', 'Open Pipeline: …').replace('Open Pipeline: ', '').strip()
                 
+                m1, m2, m3 = st.columns(3)
+                m1.metric("Closed Revenue", rev_text)
+                m2.metric("Open Pipeline", pipe_text)
+                m3.metric("Win Rate", win_rate)
+            except Exception:
+                st.info(content.get('revenue_summary', ''))
+                st.info(content.get('pipeline_health', ''))
+
+    elif name == "sector_breakdown":
+        with slots["sector_breakdown"].container():
+            sectors = content.get('sector_breakdown', {})
+            if sectors:
+                table_html = fragments["sector_table"] if fragments else sector_table_html(sectors)
+                st.markdown(table_html, unsafe_allow_html=True)
+            else:
+                st.write("No sector data available.")
+
+    elif name == "operational_status":
+        with slots["operational_status"].container():
+            metrics = content.get('metrics')
+            try:
+                if metrics:
+                    active, delayed = metrics['active_projects'], metrics['delayed_projects']
+                else:
+                    active = content['operational_status'].split('|')[0].replace('Active Projects: ', '').strip()
+                    delayed = content['operational_status'].split('|')[1].replace('Delayed Projects: ', '').strip()
+                st.metric("Running Projects", active)
+                st.metric("Delayed Ops", delayed, delta="- Attention Required" if int(delayed) > 0 else "On Track", delta_color="inverse")
+            except:
+                st.info(content['operational_status'])
+
+    elif name == "risk_flags":
+        with slots["risk_flags"].container():
+            for flag in content['risk_flags']:
+                if "No critical" in flag:
+                    st.success(flag)
+                else:
+                    st.error(flag)
+
+    elif name == "data_quality_warnings":
+        with slots["data_quality_warnings"].container():
             if content.get('data_quality_warnings') and content['data_quality_warnings'][0] != "Data quality is within acceptable bounds.":
                  st.markdown("#### ⚠ Data Quality Warnings")
                  for w in content['data_quality_warnings']:
                      st.warning(w)
+
+def render_report_download(slots, content, index, fragments=None):
+    report_md = fragments["report_md"] if fragments else report_markdown(content)
+    slots["download"].download_button("📩 Download PDF/Markdown", report_md, file_name="leadership_update.md", mime="text/markdown", key=f"download_report_{index}", on_click="ignore")
+
+def render_answer(msg_type, content, index=0, fragments=None):
+    if msg_type == "report":
+        slots = report_layout()
+        for name in content:
+            if 'metrics' in content and name in ("revenue_summary", "pipeline_health", "operational_status"):
+                continue
+            render_report_section(slots, content, name, fragments)
+        render_report_download(slots, content, index, fragments)
+    else:
+        st.markdown(content)
+
+def display_message(role, msg_type, content, index=0, fragments=None):
+    with st.chat_message(role):
+        render_answer(msg_type, content, index, fragments)
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+def stream_answer(prompt, index, cached=None):
+    """Render the backend answer progressively and return (type, content, etag) once the stream ends.
+
+    With a cached (etag, answer) the request is conditional; a 304 re-renders the cached answer.
+    """
+    res_type, res_content, etag, slots = "text", "Error interpreting data.", None, None
+    headers = {"If-None-Match": cached[0]} if cached else None
+    with st.spinner("Analyzing data from Monday.com..."):
+        response = get_session().post(STREAM_URL, json={"query": prompt}, headers=headers, stream=True, timeout=30)
+        if response.status_code == 304:
+            (res_type, res_content) = cached[1]
+        elif response.status_code != 200:
+            st.error(f"Backend error: {response.text}")
+            return None, None, None
         else:
-            st.markdown(content)
+            events = iter_sse(response)
+            # Hold the spinner only until the first event arrives.
+            first = next(events, ("done", {}))
+
+    if response.status_code == 304:
+        render_answer(res_type, res_content, index, build_fragments(res_type, res_content))
+        return res_type, res_content, cached[0]
+
+    for event, data in itertools.chain([first], events):
+        if event == "meta":
+            res_type, res_content = data.get("type", "report"), {}
+            slots = report_layout()
+        elif event == "section":
+            res_content[data["name"]] = data["value"]
+            render_report_section(slots, res_content, data["name"])
+        elif event == "message":
+            res_type = data.get("type", "text")
+            res_content = data.get("response", "Error interpreting data.")
+            st.markdown(res_content)
+        elif event == "done":
+            etag = data.get("etag")
+            break
+
+    if res_type == "report" and slots is not None:
+        render_report_download(slots, res_content, index)
+    return res_type, res_content, etag
 
 for i, msg in enumerate(st.session_state.messages):
-    display_message(msg["role"], msg["type"], msg["content"], i)
+    display_message(msg["role"], msg["type"], msg["content"], i, msg.get("fragments"))
 
 if prompt := st.chat_input("Ask a question (e.g., 'Prepare leadership update')..."):
     st.session_state.messages.append({"role": "user", "content": prompt, "type": "text"})
     display_message("user", "text", prompt, len(st.session_state.messages) - 1)
 
+    index = len(st.session_state.messages)
+    cache = get_answer_cache()
     with st.chat_message("assistant"):
-        with st.spinner("Analyzing data from Monday.com..."):
-            try:
-                response = requests.post(API_URL, json={"query": prompt}, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    res_type = data.get("type", "text")
-                    res_content = data.get("response", "Error interpreting data.")
-                    
-                    st.session_state.messages.append({"role": "assistant", "content": res_content, "type": res_type})
-                    st.rerun()
-                else:
-                    st.error(f"Backend error: {response.text}")
-            except requests.exceptions.RequestException as e:
-                st.error(f"Failed to connect to backend at {API_URL}: {e}")
+        try:
+            # A repeated question on unchanged data comes back as a bodiless 304.
+            res_type, res_content, etag = stream_answer(prompt, index, cache.get(prompt))
+        except requests.exceptions.RequestException as e:
+            res_type, etag = None, None
+            st.error(f"Failed to connect to backend at {API_URL}: {e}")
+    if etag and res_type in ("text", "report"):
+        cache.put(prompt, etag, (res_type, res_content))
+
+    if res_type is not None:
+        # Already on screen: record it for later reruns instead of re-rendering the whole chat now.
+        st.session_state.messages.append({"role": "assistant", "content": res_content, "type": res_type, "fragments": build_fragments(res_type, res_content)})
@@ -0,0 +1 @@
+"""Offline benchmark tooling: synthetic Monday boards, a fake GraphQL server and timing runners."""
@@ -0,0 +1,203 @@
+"""A local stand-in for api.monday.com/v2 serving synthetic boards.
+
+It understands the handful of GraphQL shapes MondayClient sends (board listing,
+items_page and next_items_page with cursors) and can inject latency and 429s.
+Run standalone with `python -m benchmarks.fake_monday --items 10000`.
+"""
+import argparse
+import base64
+import json
+import logging
+import random
+import re
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic_boards import BOARD_SPECS, make_item
+
+logger = logging.getLogger(__name__)
+
+# Monday's default per-minute complexity budget.
+COMPLEXITY_BUDGET = 10_000_000
+
+BOARDS = {
+    "1001": ("Deals", "deals"),
+    "1002": ("Work Orders", "work_orders"),
+}
+
+ITEM_ID_BASES = {kind: spec[2] for kind, spec in BOARD_SPECS.items()}
+
+def _encode_cursor(board_id, offset):
+    return base64.urlsafe_b64encode(f"{board_id}:{offset}".encode()).decode()
+
+def _decode_cursor(cursor):
+    board_id, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+    return board_id, int(offset)
+
+class FakeMondayServer:
+    def __init__(self, deals_items=1000, work_orders_items=1000, missing_rate=0.1, seed=0,
+                 latency=0.0, rate_limit_rate=0.0, host="127.0.0.1", port=0):
+        self.sizes = {"deals": deals_items, "work_orders": work_orders_items}
+        self.missing_rate = missing_rate
+        self.seed = seed
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.today = date.today()
+        self.stats = {"requests": 0, "rate_limited": 0}
+        self.complexity_budget = COMPLEXITY_BUDGET
+        self._budget_reset_at = time.monotonic() + 60
+        self._rng = random.Random(seed)
+        # Items that exist beyond the generated boards (e.g. created by replayed webhooks), by id.
+        self.extra_items = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v2"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def add_items(self, items):
+        """Make items re-fetchable by id, as Monday does for items created after the boards were generated."""
+        with self._lock:
+            self.extra_items.update((str(item["id"]), item) for item in items)
+
+    def _page(self, board_id, offset, limit):
+        kind = BOARDS[board_id][1]
+        end = min(offset + limit, self.sizes[kind])
+        items = [make_item(kind, i, missing_rate=self.missing_rate, seed=self.seed, today=self.today) for i in range(offset, end)]
+        cursor = _encode_cursor(board_id, end) if end < self.sizes[kind] else None
+        return {"cursor": cursor, "items": items}
+
+    def _complexity(self, cost):
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._budget_reset_at:
+                self.complexity_budget, self._budget_reset_at = COMPLEXITY_BUDGET, now + 60
+            before = self.complexity_budget
+            self.complexity_budget = max(before - cost, 0)
+            return {"before": before, "after": self.complexity_budget, "reset_in_x_seconds": int(self._budget_reset_at - now)}
+
+    def resolve(self, query, variables):
+        """Answer one GraphQL request with a (status, body) pair."""
+        status, body = self._resolve(query, variables)
+        if "complexity" in query and "data" in body:
+            limit_match = re.search(r"limit:\s*(\d+)", query)
+            body["data"]["complexity"] = self._complexity(10 + 100 * int(limit_match.group(1) if limit_match else 1))
+        return status, body
+
+    def _resolve(self, query, variables):
+        variables = variables or {}
+        limit_match = re.search(r"limit:\s*(\d+)", query)
+        limit = int(limit_match.group(1)) if limit_match else 25
+
+        if "next_items_page" in query:
+            try:
+                board_id, offset = _decode_cursor(variables["cursor"])
+            except (KeyError, ValueError):
+                return 200, {"errors": [{"message": "CursorException: cursor has expired or is invalid"}]}
+            return 200, {"data": {"next_items_page": self._page(board_id, offset, limit)}}
+
+        if re.search(r"items\s*\(\s*ids", query):
+            items = []
+            for item_id in variables.get("ids") or []:
+                if str(item_id) in self.extra_items:
+                    items.append(self.extra_items[str(item_id)])
+                    continue
+                for board_id, (_, kind) in BOARDS.items():
+                    index = int(item_id) - ITEM_ID_BASES[kind]
+                    if 0 <= index < self.sizes[kind]:
+                        items.append(make_item(kind, index, missing_rate=self.missing_rate, seed=self.seed, today=self.today))
+            return 200, {"data": {"items": items}}
+
+        if "items_page" in query:
+            ids = variables.get("boardId")
+            ids = ids if isinstance(ids, list) else [ids]
+            boards = [{"name": BOARDS[b][0], "items_page": self._page(b, 0, limit)} for b in ids if b in BOARDS]
+            return 200, {"data": {"boards": boards}}
+
+        if "boards" in query:
+            return 200, {"data": {"boards": [{"id": b, "name": name} for b, (name, _) in BOARDS.items()]}}
+
+        return 200, {"errors": [{"message": "Unsupported query for the fake Monday server."}]}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server._lock:
+                    server.stats["requests"] += 1
+                    limited = server.rate_limit_rate and server._rng.random() < server.rate_limit_rate
+                    if limited:
+                        server.stats["rate_limited"] += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if limited:
+                    self._send(429, {"error_message": "Rate Limit Exceeded.", "status_code": 429}, {"Retry-After": "1"})
+                    return
+                try:
+                    payload = json.loads(body)
+                    status, response = server.resolve(payload.get("query", ""), payload.get("variables"))
+                except (ValueError, AttributeError) as e:
+                    status, response = 400, {"errors": [{"message": f"Invalid request: {e}"}]}
+                self._send(status, response)
+
+            def _send(self, status, response, headers=None):
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic Monday boards on a local GraphQL endpoint.")
+    parser.add_argument("--items", type=int, default=1000, help="Items per board.")
+    parser.add_argument("--missing-rate", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = FakeMondayServer(args.items, args.items, missing_rate=args.missing_rate, seed=args.seed,
+                              latency=args.latency_ms / 1000.0, rate_limit_rate=args.rate_limit_rate, port=args.port)
+    print(f"Fake Monday API listening on {server.url} (set MONDAY_API_URL to use it)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
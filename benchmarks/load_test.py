@@ -0,0 +1,391 @@
+"""Drive /api/chat with concurrent traffic and find where latency falls apart.
+
+By default the API runs under uvicorn against the fake Monday server, with Gemini
+replaced by a keyword parser that sleeps like a real model call. Each load level is
+run in turn and the saturation point is reported:
+
+    python -m benchmarks.load_test --concurrency 1,2,4,8,16,32 --duration 20
+    python -m benchmarks.load_test --rates 5,10,20,40 --workers 2 --parser-latency-ms 600
+    python -m benchmarks.load_test --log queries.jsonl --url http://localhost:8000
+
+Query logs are JSONL with one object per line; the question is read from "query"
+(or "body"/"title", so the repo's requests.jsonl works), and an optional "token"
+is sent as the bearer token that selects the tenant (--token otherwise).
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from benchmarks.fake_monday import FakeMondayServer
+from benchmarks.run_benchmarks import _git_commit
+from benchmarks.synthetic_boards import SECTORS
+
+logger = logging.getLogger(__name__)
+
+PARSER_LATENCY_ENV = "LOAD_TEST_PARSER_LATENCY_MS"
+# Set on every response of the local API, so warm-up can tell when each uvicorn worker has answered.
+WORKER_HEADER = "X-Load-Test-Worker"
+
+# (weight, template) pairs; roughly what founders ask, leadership updates being the heavy tail.
+QUERY_TEMPLATES = [
+    (4, "What is our closed revenue in {sector} {timeframe}?"),
+    (3, "How is the pipeline looking {timeframe}?"),
+    (2, "What is the win rate for {sector}?"),
+    (3, "How many active projects do we have in {sector}?"),
+    (1, "Are any teams overloaded {timeframe}?"),
+    (2, "Prepare a leadership update for {sector} {timeframe}"),
+    (1, "How are things?"),
+]
+TIMEFRAMES = ["this month", "this quarter", "this year", ""]
+
+def synthetic_queries(n, seed=0):
+    rng = random.Random(seed)
+    weights = [w for w, _ in QUERY_TEMPLATES]
+    templates = [t for _, t in QUERY_TEMPLATES]
+    queries = []
+    for _ in range(n):
+        template = rng.choices(templates, weights)[0]
+        sector = rng.choice(SECTORS + ["all sectors"])
+        text = template.format(sector=sector, timeframe=rng.choice(TIMEFRAMES))
+        queries.append({"query": " ".join(text.split())})
+    return queries
+
+def load_query_log(path):
+    queries = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("query") or record.get("body") or record.get("title")
+            if text:
+                queries.append({"query": text, "token": record.get("token")})
+    return queries
+
+def create_app():
+    """uvicorn factory: the real API with Gemini swapped for a keyword parser of configurable latency."""
+    import main
+    from query_parser import QueryParser
+    from metrics import timed_stage
+
+    latency = float(os.environ.get(PARSER_LATENCY_ENV, 0)) / 1000.0
+
+    class StubQueryParser(QueryParser):
+        @timed_stage("parse_query")
+        def parse_query(self, query):
+            if latency:
+                time.sleep(latency * random.uniform(0.5, 1.5))
+            intent = self._fallback_parse(query)
+            for timeframe in ("month", "quarter", "year"):
+                if f"this {timeframe}" in query.lower():
+                    intent["timeframe"] = f"this_{timeframe}"
+            return intent
+
+    main.query_parser = StubQueryParser()
+    main.query_parser.client = None
+
+    @main.app.middleware("http")
+    async def tag_worker(request, call_next):
+        response = await call_next(request)
+        response.headers[WORKER_HEADER] = str(os.getpid())
+        return response
+
+    return main.app
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_local_api(monday_url, workers, parser_latency_ms, ready_timeout=120):
+    """Run the API under uvicorn in a subprocess and wait for /api/ready."""
+    port = _free_port()
+    env = dict(os.environ, MONDAY_API_URL=monday_url, MONDAY_API_KEY="load-test", **{PARSER_LATENCY_ENV: str(parser_latency_ms)})
+    env.pop("GEMINI_API_KEY", None)
+    env.pop("MONDAY_TENANTS", None)
+    env.pop("BI_API_TOKEN", None)
+    cmd = [sys.executable, "-m", "uvicorn", "benchmarks.load_test:create_app", "--factory",
+           "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(cmd, env=env, cwd=root)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+        try:
+            if requests.get(f"{url}/api/ready", timeout=2).status_code == 200:
+                return process, url
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"API not ready after {ready_timeout}s")
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+class LoadRunner:
+    """Sends queries to /api/chat (or /api/chat/stream) and records per-request latency and outcome."""
+
+    def __init__(self, url, queries, stream=False, timeout=60, token=None):
+        self.url = url.rstrip("/") + ("/api/chat/stream" if stream else "/api/chat")
+        self.queries = queries
+        self.token = token
+        self.stream = stream
+        self.timeout = timeout
+        self._local = threading.local()
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _next_query(self):
+        with self._lock:
+            query = self.queries[self._next % len(self.queries)]
+            self._next += 1
+        return query
+
+    def _post(self, query, session):
+        token = query.get("token") or self.token
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        if session is None:
+            # A connection of its own, closed afterwards, so the server may hand it to any worker.
+            session, headers = requests, {**headers, "Connection": "close"}
+        return session.post(self.url, json={"query": query["query"]}, headers=headers, timeout=self.timeout, stream=self.stream)
+
+    def _error(self, response, body):
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}"
+        if self.stream:
+            return _stream_error(body)
+        return "error response" if json.loads(body).get("type") == "error" else None
+
+    def send(self, query, started=None):
+        """Return (latency seconds, error or None); latency counts from `started` so queueing is included."""
+        started = started or time.perf_counter()
+        try:
+            response = self._post(query, self._session())
+            error = self._error(response, response.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            error = type(e).__name__
+        return time.perf_counter() - started, error
+
+    def warm_up(self, workers, max_rounds=50):
+        """Query over fresh connections until `workers` distinct workers of the local API have answered.
+
+        A worker loads its boards on its first query, so this keeps cold loads out of the first level.
+        Returns the number of workers seen answering.
+        """
+        seen = set()
+        with ThreadPoolExecutor(max_workers=2 * workers) as pool:
+            for _ in range(max_rounds if workers > 1 else 1):
+                # Concurrent requests keep busy workers from taking every new connection.
+                for response in pool.map(lambda q: self._post(q, None), [self._next_query() for _ in range(2 * workers)]):
+                    if self._error(response, response.content) is None and response.headers.get(WORKER_HEADER):
+                        seen.add(response.headers[WORKER_HEADER])
+                if len(seen) >= workers:
+                    break
+        return len(seen)
+
+    def closed_loop(self, concurrency, duration):
+        """`concurrency` clients, each sending its next request as soon as the last one returns."""
+        deadline = time.perf_counter() + duration
+        samples = []
+
+        def client():
+            while time.perf_counter() < deadline:
+                samples.append(self.send(self._next_query()))
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - start
+
+    def open_loop(self, rate, duration, max_in_flight, seed=0):
+        """Poisson arrivals at `rate` per second, whether or not earlier requests have returned."""
+        rng = random.Random(seed)
+        samples = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            arrival = start
+            while True:
+                arrival += rng.expovariate(rate)
+                if arrival - start >= duration:
+                    break
+                time.sleep(max(0.0, arrival - time.perf_counter()))
+                pool.submit(lambda q, t: samples.append(self.send(q, t)), self._next_query(), arrival)
+        return samples, time.perf_counter() - start
+
+def _stream_error(body):
+    """The error of an /api/chat/stream answer: error messages arrive inside a 200 event stream."""
+    event, done = None, False
+    for line in body.decode(errors="replace").splitlines():
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+            done = done or event == "done"
+        elif line.startswith("data:") and event == "message" and json.loads(line[len("data:"):]).get("type") == "error":
+            return "error response"
+    return None if done else "incomplete stream"
+
+def summarize(samples, elapsed, duration=None):
+    latencies = sorted(latency for latency, error in samples if error is None)
+    errors = {}
+    for _, error in samples:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    total = len(samples)
+    return {
+        "requests": total,
+        "offered_rps": total / duration if duration else None,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "error_rate": (total - len(latencies)) / total if total else 0.0,
+        "errors": errors,
+        "p50_ms": _ms(_percentile(latencies, 50)),
+        "p95_ms": _ms(_percentile(latencies, 95)),
+        "p99_ms": _ms(_percentile(latencies, 99)),
+        "max_ms": _ms(latencies[-1] if latencies else None),
+    }
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+def _fmt_ms(value):
+    return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+def find_saturation(levels, open_loop, slo_ms=None, max_error_rate=0.01, min_gain=0.1):
+    """Return (last sustainable level, the level where it broke, why) from [(level, summary), ...].
+
+    Closed loop saturates when more clients stop buying at least `min_gain` more throughput;
+    open loop when requests pile up, i.e. throughput falls below 80% of what actually arrived
+    (the drain after the last arrival costs a little even when keeping up). Either way, a p95
+    above the SLO or too many errors also count.
+    """
+    previous = None
+    for level, summary in levels:
+        reason = None
+        if summary["error_rate"] > max_error_rate:
+            reason = f"error rate {summary['error_rate']:.1%}"
+        elif slo_ms and (summary["p95_ms"] is None or summary["p95_ms"] > slo_ms):
+            reason = f"p95 above {slo_ms:.0f} ms"
+        elif open_loop and summary["throughput_rps"] < 0.8 * summary["offered_rps"]:
+            reason = f"only {summary['throughput_rps']:.1f} of {summary['offered_rps']:.1f} req/s served"
+        elif not open_loop and previous and summary["throughput_rps"] < previous[1]["throughput_rps"] * (1 + min_gain):
+            reason = f"throughput plateaued at {previous[1]['throughput_rps']:.1f} req/s"
+        if reason:
+            return (previous[0] if previous else None), level, reason
+        previous = (level, summary)
+    return (previous[0] if previous else None), None, None
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /api/chat and report throughput, latency percentiles and saturation.")
+    parser.add_argument("--url", help="Base URL of a running API. Without it, a local API is started on the fake Monday server.")
+    parser.add_argument("--log", help="JSONL query log to replay (defaults to a synthetic mix).")
+    parser.add_argument("--token", help="API token of the tenant to query (BI_API_TOKEN for the default tenant).")
+    parser.add_argument("--queries", type=int, default=500, help="Size of the synthetic query mix.")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Comma-separated concurrent clients per level (closed loop).")
+    parser.add_argument("--rates", help="Comma-separated arrival rates in req/s (open loop); --concurrency's largest value caps in-flight requests.")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per load level.")
+    parser.add_argument("--stream", action="store_true", help="Hit /api/chat/stream and time the full event stream.")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--slo-ms", type=float, help="p95 latency target; levels above it count as saturated.")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local API.")
+    parser.add_argument("--items", type=int, default=5000, help="Items per fake Monday board.")
+    parser.add_argument("--monday-latency-ms", type=float, default=50.0)
+    parser.add_argument("--parser-latency-ms", type=float, default=400.0, help="Mean latency of the stand-in for Gemini.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="bench_results")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    queries = load_query_log(args.log) if args.log else synthetic_queries(args.queries, args.seed)
+    if not queries:
+        parser.error("no queries to send")
+    concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    rates = [float(r) for r in args.rates.split(",") if r.strip()] if args.rates else None
+
+    server = process = None
+    try:
+        if args.url:
+            url = args.url
+        else:
+            server = FakeMondayServer(args.items, args.items, seed=args.seed, latency=args.monday_latency_ms / 1000.0).start()
+            process, url = start_local_api(server.url, args.workers, args.parser_latency_ms)
+            logger.info(f"Local API on {url} ({args.workers} worker(s), {args.items:,} items per board)")
+
+        runner = LoadRunner(url, queries, stream=args.stream, timeout=args.timeout, token=args.token)
+        # Every worker loads its boards on its first query; keep that out of the first level.
+        if args.url:
+            for _ in range(max(4, 4 * args.workers)):
+                runner._post(runner._next_query(), None).close()
+        else:
+            warmed = runner.warm_up(args.workers)
+            if warmed < args.workers:
+                logger.warning(f"Only {warmed} of {args.workers} workers answered during warm-up; the first level may include cold loads.")
+
+        levels = []
+        logger.info(f"{'level':>10} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for level in rates or concurrency:
+            if rates:
+                samples, elapsed = runner.open_loop(level, args.duration, max(concurrency), args.seed)
+            else:
+                samples, elapsed = runner.closed_loop(level, args.duration)
+            summary = summarize(samples, elapsed, args.duration if rates else None)
+            levels.append((level, summary))
+            logger.info(f"{level:>10g} {summary['requests']:>9} {summary['throughput_rps']:>8.1f} {_fmt_ms(summary['p50_ms'])} "
+                        f"{_fmt_ms(summary['p95_ms'])} {_fmt_ms(summary['p99_ms'])} {summary['error_rate']:>7.1%}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if server is not None:
+            server.stop()
+
+    unit = "req/s" if rates else "clients"
+    sustained, broke_at, reason = find_saturation(levels, bool(rates), args.slo_ms, args.max_error_rate)
+    if broke_at is None:
+        logger.info(f"\nNo saturation up to {levels[-1][0]:g} {unit}; try higher levels.")
+    else:
+        last = f"{sustained:g} {unit}" if sustained is not None else "none"
+        logger.info(f"\nSaturated at {broke_at:g} {unit} ({reason}); last sustainable level: {last}.")
+
+    commit = _git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "mode": "open_loop" if rates else "closed_loop",
+            "params": {k: v for k, v in vars(args).items() if k != "output_dir"},
+        },
+        "levels": [{"level": level, **summary} for level, summary in levels],
+        "saturation": {"sustained": sustained, "broke_at": broke_at, "reason": reason},
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"load-{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    logger.info(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
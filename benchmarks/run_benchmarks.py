@@ -0,0 +1,197 @@
+"""Time every stage of the pipeline against synthetic boards and compare runs across commits.
+
+    python -m benchmarks.run_benchmarks --sizes 1000,10000,100000
+    python -m benchmarks.run_benchmarks --compare bench_results/<baseline>.json
+
+Results are written as JSON to bench_results/ keyed by board size and stage.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.fake_monday import FakeMondayServer
+
+logger = logging.getLogger(__name__)
+
+CHAT_QUERIES = [
+    "Prepare a leadership update",
+    "What is our closed revenue in Mining?",
+    "How is the pipeline looking this quarter?",
+    "How many active projects do we have?",
+]
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "max": ordered[-1],
+    }
+
+class StageTimer:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def time(self, stage, fn, repeat=None):
+        """Run fn `repeat` times, record wall-clock seconds under `stage` and return the last result."""
+        samples = []
+        result = None
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            result = fn()
+            samples.append(time.perf_counter() - start)
+        self.results[stage] = _summarize(samples)
+        logger.info(f"{stage:<36} median {self.results[stage]['median'] * 1000:10.2f} ms")
+        return result
+
+def run_size(n_items, args):
+    """Benchmark one board size end to end against a fresh fake server."""
+    from monday_client import MondayClient
+    from data_cleaner import DataCleaner
+    from bi_engine import BIEngine
+    from report_generator import ReportGenerator
+
+    timer = StageTimer(args.repeat)
+    with FakeMondayServer(n_items, n_items, missing_rate=args.missing_rate, seed=args.seed,
+                          latency=args.latency_ms / 1000.0, rate_limit_rate=args.rate_limit_rate) as server:
+        os.environ["MONDAY_API_URL"] = server.url
+        client = MondayClient()
+
+        fetch_repeat = args.fetch_repeat or args.repeat
+        raw_deals = timer.time("fetch.deals", lambda: client.fetch_board_data("Deals"), fetch_repeat)
+        raw_wo = timer.time("fetch.work_orders", lambda: client.fetch_board_data("Work Orders"), fetch_repeat)
+        # What TenantState.refresh does: items flattened while the pages are still being decoded.
+        timer.time("fetch_extract.deals", lambda: DataCleaner()._extract_column_dicts(client.iter_board_items("Deals")), fetch_repeat)
+
+        cleaner = DataCleaner()
+        timer.time("clean.extract_column_dicts", lambda: cleaner._extract_column_dicts(raw_deals))
+        deals_df = timer.time("clean.deals", lambda: DataCleaner().clean_deals_data(raw_deals))
+        wo_df = timer.time("clean.work_orders", lambda: DataCleaner().clean_work_orders_data(raw_wo))
+        cleaner.clean_deals_data(raw_deals)
+        cleaner.clean_work_orders_data(raw_wo)
+
+        engine = BIEngine(deals_df, wo_df)
+        for sector in ("all", "Mining"):
+            timer.time(f"kpi.deals_kpis[{sector}]", lambda: engine.deals_kpis(timeframe="this_quarter", sector=sector))
+            timer.time(f"kpi.work_orders_kpis[{sector}]", lambda: engine.work_orders_kpis(timeframe="this_quarter", sector=sector))
+            timer.time(f"kpi.cross_board_intelligence[{sector}]", lambda: engine.cross_board_intelligence(timeframe="this_quarter", sector=sector))
+        timer.time("report.leadership_update", lambda: ReportGenerator(engine, cleaner).generate_leadership_update())
+        timer.time("drilldown.build_indexes", engine.build_indexes)
+        timer.time("drilldown.top_open_deals[Mining]", lambda: engine.top_open_deals(sector="Mining", timeframe="this_year", limit=20))
+        timer.time("drilldown.delayed_work_orders[all]", lambda: engine.delayed_work_orders(limit=20))
+
+        if not args.skip_e2e:
+            _time_chat(timer, server, args)
+
+        stats = dict(server.stats)
+    return {"stages": timer.results, "server": stats, "rows": {"deals": len(deals_df), "work_orders": len(wo_df)}}
+
+def _time_chat(timer, server, args):
+    """Time /api/chat in-process: once cold (includes the Monday refresh), then warm per query."""
+    from fastapi.testclient import TestClient
+    import main
+
+    tenant = main.tenant_pool.get()
+    tenant.client.url = server.url
+    tenant.client.api_key = tenant.client.api_key or "benchmark"
+    tenant.client.boards = {}
+    if not args.use_gemini:
+        main.query_parser.client = None
+
+    client = TestClient(main.app)
+
+    def cold():
+        tenant.unload()
+        return client.post("/api/chat", json={"query": CHAT_QUERIES[0]})
+
+    timer.time("e2e.api_chat[cold]", cold, args.fetch_repeat or args.repeat)
+    for i, query in enumerate(CHAT_QUERIES):
+        timer.time(f"e2e.api_chat[q{i}]", lambda: client.post("/api/chat", json={"query": query}))
+
+def compare(current, baseline, threshold):
+    """Print median deltas against a baseline run and return the regressions beyond `threshold`."""
+    regressions = []
+    print(f"\nComparing against {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+    print(f"{'size':>9}  {'stage':<36} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for size, result in current["results"].items():
+        base_stages = baseline["results"].get(size, {}).get("stages", {})
+        for stage, summary in result["stages"].items():
+            if stage not in base_stages:
+                continue
+            before, after = base_stages[stage]["median"], summary["median"]
+            change = (after - before) / before if before else 0.0
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{size:>9}  {stage:<36} {before * 1000:12.2f} {after * 1000:12.2f} {change:+8.1%}{flag}")
+            if flag:
+                regressions.append((size, stage, change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fetch, cleaning, KPIs and /api/chat on synthetic boards.")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated items per board, e.g. 1000,10000,1000000.")
+    parser.add_argument("--missing-rate", type=float, default=0.1, help="Probability that any non-key column is blank.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency injected into every fake Monday response.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of fake Monday responses that are 429s.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per in-memory stage.")
+    parser.add_argument("--fetch-repeat", type=int, default=0, help="Runs per network stage (defaults to --repeat).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-e2e", action="store_true", help="Skip the in-process /api/chat timings.")
+    parser.add_argument("--use-gemini", action="store_true", help="Let /api/chat call Gemini instead of the keyword parser.")
+    parser.add_argument("--output-dir", default="bench_results")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Median slowdown counted as a regression (0.2 = 20%%).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for noisy in ("monday_client", "httpx"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    commit = _git_commit()
+    results = {}
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        logger.info(f"\n=== {size:,} items per board ===")
+        results[str(size)] = run_size(size, args)
+
+    current = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("compare", "output_dir")},
+        },
+        "results": results,
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    with open(path, "w") as f:
+        json.dump(current, f, indent=2)
+    logger.info(f"\nResults written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(current, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}.")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Deterministic generators for messy Deals and Work Orders boards shaped like the real ones (see cols.txt)."""
+import json
+import random
+from datetime import date, timedelta
+
+DEALS_COLUMNS = ['Owner code', 'Client Code', 'Deal Status', 'Close Date (A)', 'Closure Probability', 'Masked Deal value', 'Tentative Close Date', 'Deal Stage', 'Product deal', 'Sector/service', 'Created Date']
+
+WORK_ORDERS_COLUMNS = ['Customer Name Code', 'Serial #', 'Nature of Work', 'Last executed month of recurring project', 'Execution Status', 'Data Delivery Date', 'Date of PO/LOI', 'Document Type', 'Probable Start Date', 'Probable End Date', 'BD/KAM Personnel code', 'Sector', 'Type of Work', 'Is any Skylark software platform part of the client deliverables in this deal?', 'Last invoice date', 'latest invoice no.', 'Amount in Rupees (Excl of GST) (Masked)', 'Amount in Rupees (Incl of GST) (Masked)', 'Billed Value in Rupees (Excl of GST.) (Masked)', 'Billed Value in Rupees (Incl of GST.) (Masked)', 'Collected Amount in Rupees (Incl of GST.) (Masked)', 'Amount to be billed in Rs. (Exl. of GST) (Masked)', 'Amount to be billed in Rs. (Incl. of GST) (Masked)', 'Amount Receivable (Masked)', 'AR Priority account', 'Quantity by Ops', 'Quantities as per PO', 'Quantity billed (till date)', 'Balance in quantity', 'Invoice Status', 'Expected Billing Month', 'Actual Billing Month', 'Actual Collection Month', 'WO Status (billed)', 'Collection status', 'Collection Date', 'Billing Status']
+
+SECTORS = ["Aviation", "Construction", "Dsp", "Manufacturing", "Mining", "Powerline", "Railways", "Renewables", "Security And Surveillance", "Tender"]
+
+# Columns that keep a value even when missing values are injected, so every row stays addressable.
+ALWAYS_PRESENT = {"Deal Stage", "Execution Status"}
+
+def _messy_sector(rng):
+    sector = rng.choice(SECTORS)
+    return rng.choice([sector, sector.lower(), sector.upper(), f" {sector} ", sector.replace(" And ", " and ")])
+
+def _messy_date(rng, today):
+    d = today + timedelta(days=rng.randint(-400, 200))
+    return rng.choice([d.isoformat(), d.isoformat(), d.isoformat(), d.strftime("%d/%m/%Y")])
+
+def _messy_amount(rng):
+    amount = rng.randint(5_000, 5_000_000)
+    return rng.choice([str(amount), f"{amount:,}", f"₹{amount:,}", f"{amount}.00", "None"])
+
+def _deal_values(rng, today):
+    return {
+        'Owner code': f"OWNER_{rng.randint(1, 40):03d}",
+        'Client Code': f"COMPANY{rng.randint(1, 400):03d}",
+        'Deal Status': rng.choice(["Open", "Open", "Won", "Dead", "On Hold"]),
+        'Close Date (A)': _messy_date(rng, today) if rng.random() < 0.4 else "",
+        'Closure Probability': rng.choice(["High", "Medium", "Low", "80%", "35%", "0.6", "unknown"]),
+        'Masked Deal value': _messy_amount(rng),
+        'Tentative Close Date': _messy_date(rng, today),
+        'Deal Stage': rng.choice(["Open", "Open", "On Hold", "Closed Won", "Closed Lost", "Won", "Cancelled", "Negotiations"]),
+        'Product deal': rng.choice(["Pure Service", "Spectra Deal", "Product + Service", ""]),
+        'Sector/service': _messy_sector(rng),
+        'Created Date': _messy_date(rng, today),
+    }
+
+def _work_order_values(rng, today):
+    amount = rng.randint(10_000, 9_000_000)
+    billed = int(amount * rng.random())
+    quantity = rng.randint(1, 500)
+    values = {title: "" for title in WORK_ORDERS_COLUMNS}
+    values.update({
+        'Customer Name Code': f"WOCOMPANY_{rng.randint(1, 300):03d}",
+        'Serial #': f"SDPLDEAL-{rng.randint(1, 9999):04d}",
+        'Nature of Work': rng.choice(["One time Project", "Monthly Contract", "Annual Rate Contract", "Proof of Concept"]),
+        'Execution Status': rng.choice(["Completed", "Ongoing", "Not Started", "Executed until current month", "Pause / struck", "Partial Completed", "Details pending from Client"]),
+        'Data Delivery Date': _messy_date(rng, today),
+        'Date of PO/LOI': _messy_date(rng, today),
+        'Document Type': rng.choice(["Purchase Order", "LOI", "Email Confirmation"]),
+        'Probable Start Date': _messy_date(rng, today),
+        'Probable End Date': _messy_date(rng, today),
+        'BD/KAM Personnel code': f"OWNER_{rng.randint(1, 40):03d}",
+        'Sector': _messy_sector(rng),
+        'Type of Work': rng.choice(["Spraying", "Topographic Survey", "Inspection", "Mapping"]),
+        'Amount in Rupees (Excl of GST) (Masked)': str(amount),
+        'Amount in Rupees (Incl of GST) (Masked)': str(int(amount * 1.18)),
+        'Billed Value in Rupees (Excl of GST.) (Masked)': str(billed),
+        'Billed Value in Rupees (Incl of GST.) (Masked)': str(int(billed * 1.18)),
+        'Amount Receivable (Masked)': str(amount - billed),
+        'Quantity by Ops': str(quantity),
+        'Quantities as per PO': str(quantity),
+        'Invoice Status': rng.choice(["Billed", "Not Billed yet", "Partially Billed"]),
+        'WO Status (billed)': rng.choice(["Open", "Closed"]),
+        'Collection status': rng.choice(["Fully Collected", "Not Collected", "Partially Collected"]),
+        'Billing Status': rng.choice(["Billed", "Not Billable", "Partially Billed", "Update Required"]),
+    })
+    return values
+
+BOARD_SPECS = {
+    "deals": (DEALS_COLUMNS, _deal_values, 10_000_000),
+    "work_orders": (WORK_ORDERS_COLUMNS, _work_order_values, 20_000_000),
+}
+
+def column_id(title, position):
+    """Stable, unique Monday-style column id (real ids look like "status", "date4" or "text_mkx1")."""
+    return f"{''.join(ch for ch in title.lower().split()[0] if ch.isalnum())[:10] or 'col'}_{position}"
+
+def make_item(kind, index, missing_rate=0.1, seed=0, today=None):
+    """Build item `index` of a synthetic board in Monday's items_page shape; the same arguments always give the same item."""
+    columns, make_values, id_base = BOARD_SPECS[kind]
+    rng = random.Random(seed * 1_000_003 + index + id_base)
+    values = make_values(rng, today or date.today())
+    column_values = []
+    for position, title in enumerate(columns):
+        text = values.get(title, "")
+        if title not in ALWAYS_PRESENT and rng.random() < missing_rate:
+            text = rng.choice(["", None])
+        column_values.append({
+            "id": column_id(title, position),
+            "text": text,
+            "type": "text",
+            "value": json.dumps(text) if text else None,
+            "column": {"title": title},
+        })
+    return {"id": str(id_base + index), "name": f"{kind.rstrip('s').title()} {index}", "column_values": column_values}
+
+def make_board(kind, n_items, missing_rate=0.1, seed=0):
+    today = date.today()
+    return [make_item(kind, i, missing_rate=missing_rate, seed=seed, today=today) for i in range(n_items)]
@@ -0,0 +1,254 @@
+"""Replay synthetic Monday webhook events against /api/webhooks/monday and check the result.
+
+Events are generated from a synthetic board served by the fake Monday server, then
+delivered with duplicates and local reordering. In-process runs (the default) compare the
+patched frames with a fresh clean of the expected final rows:
+
+    python -m benchmarks.webhook_replay --items 5000 --events 2000 --duplicate-rate 0.1 --reorder-window 8
+
+Pass --url to fire the same event stream at a running service instead (no verification).
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import requests
+
+from benchmarks.fake_monday import FakeMondayServer
+from benchmarks.synthetic_boards import DEALS_COLUMNS, SECTORS, WORK_ORDERS_COLUMNS, column_id, make_item
+
+logger = logging.getLogger(__name__)
+
+BOARD_IDS = {"deals": "1001", "work_orders": "1002"}
+COLUMNS = {"deals": DEALS_COLUMNS, "work_orders": WORK_ORDERS_COLUMNS}
+
+# (title, value factory) pairs; each factory returns (webhook value, expected text).
+def _label(choices):
+    def make(rng):
+        text = rng.choice(choices)
+        return {"label": {"index": 0, "text": text}, "post_id": None}, text
+    return make
+
+def _date(rng):
+    text = (date.today() + timedelta(days=rng.randint(-200, 200))).isoformat()
+    return {"date": text, "time": None}, text
+
+def _number(rng):
+    text = str(rng.randint(1_000, 2_000_000))
+    return {"value": text, "unit": None}, text
+
+MUTABLE_COLUMNS = {
+    "deals": [
+        ("Deal Stage", _label(["Open", "On Hold", "Closed Won", "Closed Lost", "Cancelled"])),
+        ("Closure Probability", _label(["High", "Medium", "Low"])),
+        ("Masked Deal value", _number),
+        ("Tentative Close Date", _date),
+        ("Close Date (A)", _date),
+        ("Sector/service", _label(SECTORS)),
+    ],
+    "work_orders": [
+        ("Execution Status", _label(["Completed", "Ongoing", "Not Started", "Pause / struck"])),
+        ("Data Delivery Date", _date),
+        ("Sector", _label(SECTORS)),
+        ("Billing Status", _label(["Billed", "Not Billable", "Partially Billed"])),
+    ],
+}
+
+def generate_events(kind, n_items, n_events, missing_rate=0.1, seed=0, event_seed=0):
+    """Return (events in true order, initial rows, expected final rows) for one board built with `seed`."""
+    rng = random.Random(event_seed)
+    rows = {}
+    for i in range(n_items):
+        item = make_item(kind, i, missing_rate, seed)
+        row = {"id": item["id"], "name": item["name"]}
+        row.update({c["column"]["title"]: c["text"] for c in item["column_values"]})
+        rows[item["id"]] = row
+    initial = {k: dict(v) for k, v in rows.items()}
+
+    live = list(rows)
+    positions = {title: position for position, title in enumerate(COLUMNS[kind])}
+    next_new_id = 90_000_000 + event_seed * 100_000
+    clock = time.time()
+    events = []
+
+    def next_base():
+        nonlocal clock
+        clock += rng.uniform(0.001, 0.5)
+        return {"boardId": int(BOARD_IDS[kind]), "triggerUuid": uuid.uuid4().hex, "changedAt": clock,
+                "triggerTime": datetime.fromtimestamp(clock, timezone.utc).isoformat().replace("+00:00", "Z")}
+
+    def update_event(base, item_id):
+        title, factory = rng.choice(MUTABLE_COLUMNS[kind])
+        value, text = factory(rng)
+        rows[item_id][title] = text
+        event = {**base, "type": "update_column_value", "pulseId": int(item_id),
+                 "columnId": column_id(title, positions[title]), "value": value}
+        if rng.random() < 0.5:
+            event["columnTitle"] = title
+        return event
+
+    while len(events) < n_events:
+        base = next_base()
+        roll = rng.random()
+
+        if roll < 0.05 and len(live) > 1:
+            item_id = live.pop(rng.randrange(len(live)))
+            rows.pop(item_id)
+            events.append({**base, "type": "delete_pulse", "pulseId": int(item_id)})
+        elif roll < 0.10:
+            item_id = str(next_new_id)
+            next_new_id += 1
+            name = f"New {kind} {item_id}"
+            row = rows[item_id] = {"id": item_id, "name": name}
+            live.append(item_id)
+            if rng.random() < 0.25:
+                # Edited before its create event was stamped (e.g. filled in by an import first); the create
+                # carries the final values, so the edit must lose even when it is delivered after the create.
+                events.append(update_event(base, item_id))
+                base = next_base()
+            column_values = {}
+            for title, factory in MUTABLE_COLUMNS[kind]:
+                value, text = factory(rng)
+                column_values[column_id(title, positions[title])] = value
+                row[title] = text
+            events.append({**base, "type": "create_pulse", "pulseId": int(item_id), "pulseName": name, "columnValues": column_values})
+            if rng.random() < 0.5:
+                # Edited right after creation: with reordering the update often lands before the create.
+                events.append(update_event(next_base(), item_id))
+        elif roll < 0.13:
+            item_id = rng.choice(live)
+            name = f"{rows[item_id]['name']} (renamed)"
+            rows[item_id]["name"] = name
+            events.append({**base, "type": "update_name", "pulseId": int(item_id), "value": {"name": name}})
+        else:
+            events.append(update_event(base, rng.choice(live)))
+
+    return events, initial, rows
+
+def created_items(kind, initial, rows):
+    """Final state of items created by the events, in Monday's item shape, for the fake server to re-sync."""
+    positions = {title: position for position, title in enumerate(COLUMNS[kind])}
+    items = []
+    for item_id, row in rows.items():
+        if item_id in initial:
+            continue
+        column_values = [{"id": column_id(title, positions[title]), "text": text, "type": "text",
+                          "value": json.dumps(text) if text else None, "column": {"title": title}}
+                         for title, text in row.items() if title in positions]
+        items.append({"id": item_id, "name": row["name"], "column_values": column_values})
+    return items
+
+def delivery_order(events, duplicate_rate, reorder_window, seed=0):
+    """Shuffle events within a sliding window and inject duplicate deliveries."""
+    rng = random.Random(seed + 1)
+    delivered = []
+    for event in events:
+        delivered.append(event)
+        if rng.random() < duplicate_rate:
+            delivered.append(event)
+    if reorder_window > 1:
+        for start in range(0, len(delivered), reorder_window):
+            window = delivered[start:start + reorder_window]
+            rng.shuffle(window)
+            delivered[start:start + reorder_window] = window
+    return delivered
+
+def _frames_match(actual, expected, columns):
+    actual = actual.sort_values("id").reset_index(drop=True)[columns]
+    expected = expected.sort_values("id").reset_index(drop=True)[columns]
+    if len(actual) != len(expected):
+        return False, f"row count {len(actual)} != {len(expected)}"
+    for col in columns:
+        a, e = actual[col], expected[col]
+        mismatched = ~((a == e) | (a.isna() & e.isna()))
+        if mismatched.any():
+            first = mismatched.idxmax()
+            return False, f"column {col!r} differs for id {expected.at[first, 'id']}: {a[first]!r} != {e[first]!r}"
+    return True, "ok"
+
+def run_in_process(args):
+    from fastapi.testclient import TestClient
+
+    with FakeMondayServer(args.items, args.items, missing_rate=args.missing_rate, seed=args.seed) as server:
+        os.environ["MONDAY_API_URL"] = server.url
+        import main
+        from data_cleaner import DataCleaner
+
+        tenant = main.tenant_pool.get()
+        tenant.client.url = server.url
+        tenant.client.api_key = tenant.client.api_key or "replay"
+        tenant.client.boards = {}
+        tenant.refresh()
+        client = TestClient(main.app)
+        os.environ.setdefault("MONDAY_WEBHOOK_SECRET", "replay")
+        params = {"token": os.environ["MONDAY_WEBHOOK_SECRET"]}
+
+        ok = True
+        for kind, seed_offset in (("deals", 0), ("work_orders", 1)):
+            events, initial_rows, expected_rows = generate_events(kind, args.items, args.events, args.missing_rate, args.seed, args.seed + seed_offset)
+            # Updates delivered before their item's create make the processor re-fetch the item.
+            server.add_items(created_items(kind, initial_rows, expected_rows))
+            delivered = delivery_order(events, args.duplicate_rate, args.reorder_window, args.seed + seed_offset)
+
+            outcomes = {}
+            start = time.perf_counter()
+            for event in delivered:
+                status = client.post("/api/webhooks/monday", json={"event": event}, params=params).json()["status"]
+                outcomes[status] = outcomes.get(status, 0) + 1
+            elapsed = time.perf_counter() - start
+            logger.info(f"{kind}: {len(delivered)} deliveries of {len(events)} events in {elapsed:.2f}s "
+                        f"({elapsed / max(len(delivered), 1) * 1000:.2f} ms each) -> {outcomes}")
+
+            cleaner = DataCleaner()
+            if kind == "deals":
+                expected = cleaner.clean_deals_rows(list(expected_rows.values()))
+                match, detail = _frames_match(tenant.deals_df, expected, ["id", "name", "sector", "stage", "deal_value", "probability_score", "close_date"])
+                stats_match = tenant.data_cleaner.stats["deals"] == cleaner.stats["deals"]
+            else:
+                expected = cleaner.clean_work_orders_rows(list(expected_rows.values()))
+                match, detail = _frames_match(tenant.work_orders_df, expected, ["id", "name", "sector", "execution_status", "delivery_date", "billing_status"])
+                stats_match = tenant.data_cleaner.stats["work_orders"] == cleaner.stats["work_orders"]
+            logger.info(f"{kind}: frame {'matches' if match else 'MISMATCH: ' + detail}; data-quality stats {'match' if stats_match else 'MISMATCH'}")
+            ok = ok and match and stats_match
+        return ok
+
+def run_remote(args):
+    session = requests.Session()
+    params = {"token": args.token} if args.token else None
+    for kind, seed_offset in (("deals", 0), ("work_orders", 1)):
+        events, _, _ = generate_events(kind, args.items, args.events, args.missing_rate, args.seed, args.seed + seed_offset)
+        outcomes = {}
+        for event in delivery_order(events, args.duplicate_rate, args.reorder_window, args.seed + seed_offset):
+            response = session.post(args.url, json={"event": event}, params=params, timeout=30)
+            status = response.json().get("status", response.status_code) if response.ok else response.status_code
+            outcomes[status] = outcomes.get(status, 0) + 1
+        logger.info(f"{kind}: {outcomes}")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic Monday webhook events.")
+    parser.add_argument("--items", type=int, default=2000, help="Items per synthetic board.")
+    parser.add_argument("--events", type=int, default=1000, help="Events generated per board.")
+    parser.add_argument("--missing-rate", type=float, default=0.1)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="Fraction of events delivered twice.")
+    parser.add_argument("--reorder-window", type=int, default=5, help="Deliveries shuffled within windows of this size.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Webhook URL of a running service; it must be loaded from the fake Monday server with the same --items and --seed.")
+    parser.add_argument("--token", help="MONDAY_WEBHOOK_SECRET of the running service.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for noisy in ("monday_client", "httpx"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    ok = run_remote(args) if args.url else run_in_process(args)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
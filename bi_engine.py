@@ -1,27 +1,75 @@
+import threading
+
 import pandas as pd
 import numpy as np
+from metrics import timed_stage
+
+# Drill-down sort orders for open deals: name -> column, largest first.
+DEAL_SORTS = {"value": "deal_value", "weighted_value": "weighted_value"}
+
+DEAL_FIELDS = ["id", "name", "sector", "stage", "deal_value", "probability_score", "weighted_value", "close_date"]
+WORK_ORDER_FIELDS = ["id", "name", "sector", "execution_status", "billing_status", "delivery_date"]
+
+def timeframe_cutoff(timeframe, now=None):
+    """Earliest date a record may carry to fall in `timeframe`, or None for no filter."""
+    if not timeframe or timeframe.lower() == 'all':
+        return None
+    now = now or pd.Timestamp.now()
+    tf = timeframe.lower()
+    if 'month' in tf:
+        return now - pd.DateOffset(months=1)
+    if 'quarter' in tf:
+        return now - pd.DateOffset(months=3)
+    if 'year' in tf:
+        return now - pd.DateOffset(years=1)
+    return None
+
+def _sector_key(sector):
+    return (sector or "all").strip().lower()
+
+def _sector_values(sectors):
+    """A sector column normalized like _sector_key; work-order sectors are not cleaned, so may be padded or cased."""
+    return sectors.fillna('').astype(str).str.strip().str.lower()
+
+def _filter_sector(df, sector):
+    if _sector_key(sector) == 'all':
+        return df
+    return df[_sector_values(df['sector']) == _sector_key(sector)]
+
+def _records(frame):
+    """Frame rows as JSON-ready dicts: NaN/NaT become None, dates ISO strings, numpy scalars plain Python."""
+    records = []
+    for row in frame.to_dict('records'):
+        clean = {}
+        for key, value in row.items():
+            if value is None or (not isinstance(value, str) and pd.isna(value)):
+                value = None
+            elif isinstance(value, pd.Timestamp):
+                value = value.date().isoformat()
+            elif isinstance(value, np.generic):
+                value = value.item()
+            clean[key] = value
+        records.append(clean)
+    return records
 
 class BIEngine:
     def __init__(self, deals_df, work_orders_df):
         self.deals_df = deals_df
         self.work_orders_df = work_orders_df
+        self._indexes = None
+        self._index_lock = threading.Lock()
 
+    @timed_stage("deals_kpis")
     def deals_kpis(self, timeframe=None, sector=None):
         df = self.deals_df.copy()
         if df.empty:
             return {}
             
-        if sector and sector.lower() != 'all':
-            df = df[df['sector'].str.lower() == sector.lower()]
+        df = _filter_sector(df, sector)
             
-        if timeframe and timeframe.lower() != 'all':
-            now = pd.Timestamp.now()
-            if 'month' in timeframe.lower() or 'this_month' in timeframe.lower():
-                df = df[df['close_date'] >= now - pd.DateOffset(months=1)]
-            elif 'quarter' in timeframe.lower() or 'this_quarter' in timeframe.lower():
-                df = df[df['close_date'] >= now - pd.DateOffset(months=3)]
-            elif 'year' in timeframe.lower() or 'this_year' in timeframe.lower():
-                df = df[df['close_date'] >= now - pd.DateOffset(years=1)]
+        cutoff = timeframe_cutoff(timeframe)
+        if cutoff is not None:
+            df = df[df['close_date'] >= cutoff]
 
         df['stage'] = df['stage'].astype(str).str.strip().str.lower()
         
@@ -59,13 +107,13 @@ class BIEngine:
             "stage_distribution": stage_dist
         }
 
+    @timed_stage("work_orders_kpis")
     def work_orders_kpis(self, timeframe=None, sector=None):
         df = self.work_orders_df.copy()
         if df.empty:
             return {}
             
-        if sector and sector.lower() != 'all':
-            df = df[df['sector'].str.lower() == sector.lower()]
+        df = _filter_sector(df, sector)
             
         active_mask = ~df['execution_status'].str.contains('Done|Complete|Delivered|Cancelled', case=False, na=False)
         active_projects = int(active_mask.sum())
@@ -82,6 +130,7 @@ class BIEngine:
             "execution_load_by_sector": sector_load
         }
         
+    @timed_stage("cross_board_intelligence")
     def cross_board_intelligence(self, timeframe=None, sector=None):
         deals = self.deals_kpis(timeframe=timeframe, sector=sector)
         wo = self.work_orders_kpis(timeframe=timeframe, sector=sector)
@@ -120,3 +169,109 @@ class BIEngine:
             "is_overloaded": is_overloaded,
             "strategic_insight": insight
         }
+
+    @timed_stage("build_drilldown_indexes")
+    def build_indexes(self):
+        """Pre-sort open deals and delayed work orders per sector, so drill-down pages are slices.
+
+        Each index maps (sort, sector) to row positions in a compact frame holding only the
+        drill-down fields, next to that frame's dates for timeframe filtering; "all" covers every sector.
+        Rows are ordered by a numeric sort key, then id, so a page can resume after its last (key, id).
+        """
+        indexes = {}
+
+        deals = self.deals_df
+        if deals is not None and not deals.empty:
+            open_mask = deals['stage'].astype(str).str.strip().str.lower().str.contains('open|hold', regex=True, na=False)
+            compact = deals.loc[open_mask].copy()
+            compact['deal_value'] = pd.to_numeric(compact['deal_value'], errors='coerce').fillna(0.0)
+            compact['probability_score'] = pd.to_numeric(compact['probability_score'], errors='coerce')
+            compact['weighted_value'] = compact['deal_value'] * compact['probability_score']
+            compact = compact.reindex(columns=DEAL_FIELDS).reset_index(drop=True)
+            compact['close_date'] = pd.to_datetime(compact['close_date'], errors='coerce')
+            ids = compact['id'].astype(str).to_numpy(dtype=str)
+            orders = {}
+            for sort, column in DEAL_SORTS.items():
+                # Largest first, missing values last.
+                keys = -compact[column].to_numpy(dtype=float)
+                keys[np.isnan(keys)] = np.inf
+                orders[sort] = (self._by_sector(compact, np.lexsort((ids, keys))), keys)
+            indexes["deals"] = (compact, orders, ids, compact['close_date'].to_numpy())
+
+        wo = self.work_orders_df
+        if wo is not None and not wo.empty and 'is_delayed' in wo.columns:
+            delayed = wo['is_delayed'].fillna(False).astype(bool)
+            compact = wo.loc[delayed].reindex(columns=WORK_ORDER_FIELDS).reset_index(drop=True)
+            compact['delivery_date'] = pd.to_datetime(compact['delivery_date'], errors='coerce')
+            dates = compact['delivery_date'].to_numpy(dtype='datetime64[ns]')
+            ids = compact['id'].astype(str).to_numpy(dtype=str)
+            # Oldest due date first: the most overdue work order leads.
+            keys = dates.astype(np.int64).astype(float)
+            keys[np.isnat(dates)] = np.inf
+            orders = {"lateness": (self._by_sector(compact, np.lexsort((ids, keys))), keys)}
+            indexes["work_orders"] = (compact, orders, ids, dates)
+
+        self._indexes = indexes
+        return indexes
+
+    def indexes(self):
+        """The drill-down indexes, built on first use; frames are never patched in place, so they stay valid."""
+        if self._indexes is None:
+            with self._index_lock:
+                if self._indexes is None:
+                    self.build_indexes()
+        return self._indexes
+
+    @staticmethod
+    def _by_sector(compact, positions):
+        sectors = _sector_values(compact['sector']).to_numpy(dtype=object)[positions]
+        by_sector = {"all": positions}
+        for sector in np.unique(sectors):
+            # Boolean selection keeps the global sort order within each sector.
+            by_sector.setdefault(sector, positions[sectors == sector])
+        return by_sector
+
+    def _page(self, kind, sort, sector, timeframe, after, limit):
+        indexes = self.indexes()
+        if kind not in indexes:
+            return None, {"items": [], "total": 0, "next": None}
+        compact, orders, ids, dates = indexes[kind]
+        by_sector, keys = orders[sort]
+        positions = by_sector.get(_sector_key(sector), np.empty(0, dtype=np.intp))
+        cutoff = timeframe_cutoff(timeframe)
+        if cutoff is not None and len(positions):
+            positions = positions[dates[positions] >= cutoff.to_datetime64()]
+
+        start = 0
+        if after is not None:
+            # Resume after the last row served, wherever rows added or removed since have moved it.
+            key = np.inf if after[0] is None else float(after[0])
+            ordered = keys[positions]
+            lo, hi = np.searchsorted(ordered, key, side='left'), np.searchsorted(ordered, key, side='right')
+            start = lo + int(np.searchsorted(ids[positions[lo:hi]], str(after[1]), side='right'))
+        chosen = positions[start:start + limit]
+        page = compact.iloc[chosen]
+
+        next_key = None
+        if start + len(chosen) < len(positions):
+            last = chosen[-1]
+            next_key = [None if np.isinf(keys[last]) else float(keys[last]), str(ids[last])]
+        return page, {"items": _records(page), "total": int(len(positions)), "next": next_key}
+
+    def top_open_deals(self, sector="all", timeframe="all", sort="value", after=None, limit=20):
+        """Open deals, largest `sort` ("value" or "weighted_value") first, filtered like deals_kpis.
+
+        `after` is the "next" key of the previous page.
+        """
+        if sort not in DEAL_SORTS:
+            raise ValueError(f"Unknown sort '{sort}'; expected one of {sorted(DEAL_SORTS)}.")
+        return self._page("deals", sort, sector, timeframe, after, limit)[1]
+
+    def delayed_work_orders(self, sector="all", timeframe="all", after=None, limit=20):
+        """Delayed work orders, most overdue first; timeframe filters on delivery date."""
+        page, result = self._page("work_orders", "lateness", sector, timeframe, after, limit)
+        if page is not None and len(page):
+            today = pd.Timestamp.now().normalize()
+            for record, due in zip(result["items"], page['delivery_date']):
+                record["days_late"] = int((today - due.normalize()).days) if pd.notna(due) else None
+        return result
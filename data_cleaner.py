@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import logging
 from datetime import datetime
+from metrics import timed_stage
 
 logger = logging.getLogger(__name__)
 
@@ -12,8 +13,9 @@ class DataCleaner:
             "work_orders": {"delayed": 0, "missing_dates": 0, "incomplete": 0, "total_records": 0}
         }
         
-    def _extract_column_dicts(self, items):
-        """Convert monday column values into flat dicts."""
+    @timed_stage("extract_column_dicts")
+    def _extract_column_dicts(self, items, column_titles=None):
+        """Convert monday column values into flat dicts, optionally recording column id -> title."""
         rows = []
         for item in items:
             row = {"id": item["id"], "name": item["name"]}
@@ -21,15 +23,24 @@ class DataCleaner:
                 title = col.get("column", {}).get("title")
                 if title:
                     row[title] = col.get("text")
+                    if column_titles is not None:
+                        column_titles[col.get("id")] = title
             rows.append(row)
         return rows
 
     def clean_deals_data(self, items):
         if not items:
             return pd.DataFrame()
-            
-        rows = self._extract_column_dicts(items)
-        df = pd.DataFrame(rows)
+        return self.clean_deals_rows(self._extract_column_dicts(items))
+
+    @timed_stage("clean_deals_data")
+    def clean_deals_rows(self, rows):
+        """Clean flat rows as produced by _extract_column_dicts."""
+        if not rows:
+            return pd.DataFrame()
+
+        # object dtype keeps a one-row clean (webhook patch) identical to the same row cleaned in bulk
+        df = pd.DataFrame(rows, dtype=object)
         self.stats["deals"]["total_records"] = len(df)
         
         df.columns = [str(c).lower().strip().replace(' ', '_') for c in df.columns]
@@ -72,18 +83,20 @@ class DataCleaner:
         df['probability_score'] = df['probability'].apply(parse_prob)
         
         missing_val_mask = df['deal_value'].isna() | (df['deal_value'] == '') | (df['deal_value'] == 'None') | (df['deal_value'] == 'nan')
+        df['missing_deal_value'] = missing_val_mask
         self.stats["deals"]["missing_values"] = int(missing_val_mask.sum())
         
         df['deal_value'] = pd.to_numeric(df['deal_value'].astype(str).str.replace(r'[^\d.]', '', regex=True), errors='coerce')
-        df['deal_value'].fillna(0, inplace=True)
+        df['deal_value'] = df['deal_value'].fillna(0)
         
         df['close_date'] = df['actual_close_date']
         df['close_date'] = df['close_date'].fillna(df['tentative_close_date'])
         
         missing_dates_mask = df['close_date'].isna() | (df['close_date'] == '') | (df['close_date'] == 'None') | (df['close_date'] == 'nan')
+        df['missing_close_date'] = missing_dates_mask
         self.stats["deals"]["missing_close_dates"] = int(missing_dates_mask.sum())
         
-        df['close_date'] = pd.to_datetime(df['close_date'], errors='coerce')
+        df['close_date'] = pd.to_datetime(df['close_date'], errors='coerce', format='ISO8601')
         
         df['stage'] = df['stage'].astype(str).str.strip()
         df['stage'] = df['stage'].replace({'nan': 'Unknown', 'None': 'Unknown', '': 'Unknown'})
@@ -93,9 +106,16 @@ class DataCleaner:
     def clean_work_orders_data(self, items):
         if not items:
             return pd.DataFrame()
-            
-        rows = self._extract_column_dicts(items)
-        df = pd.DataFrame(rows)
+        return self.clean_work_orders_rows(self._extract_column_dicts(items))
+
+    @timed_stage("clean_work_orders_data")
+    def clean_work_orders_rows(self, rows):
+        """Clean flat rows as produced by _extract_column_dicts."""
+        if not rows:
+            return pd.DataFrame()
+
+        # object dtype keeps a one-row clean (webhook patch) identical to the same row cleaned in bulk
+        df = pd.DataFrame(rows, dtype=object)
         self.stats["work_orders"]["total_records"] = len(df)
         
         df.columns = [str(c).lower().strip().replace(' ', '_') for c in df.columns]
@@ -118,8 +138,9 @@ class DataCleaner:
         df['execution_status'] = df['execution_status'].astype(str).str.strip().str.title()
         
         missing_dates = df['delivery_date'].isna() | (df['delivery_date'] == '') | (df['delivery_date'] == 'None') | (df['delivery_date'] == 'nan')
+        df['missing_delivery_date'] = missing_dates if isinstance(missing_dates, pd.Series) else missing_dates.any(axis=1)
         self.stats["work_orders"]["missing_dates"] = int(missing_dates.sum() if isinstance(missing_dates.sum(), (int, float, np.number)) else missing_dates.sum().iloc[0] if not missing_dates.empty else 0)
-        df['delivery_date'] = pd.to_datetime(df['delivery_date'], errors='coerce')
+        df['delivery_date'] = pd.to_datetime(df['delivery_date'], errors='coerce', format='ISO8601')
         
         now = pd.Timestamp.now()
         df['is_delayed'] = (df['delivery_date'] < now) & (~df['execution_status'].astype(str).str.lower().str.contains('done|complete|delivered', regex=True, na=False))
@@ -128,9 +149,32 @@ class DataCleaner:
         df['billing_status'] = df['billing_status'].astype(str).str.strip().str.title()
         
         incomplete_mask = df['execution_status'].astype(str).str.contains('Nan|Unknown|None', case=False) | df['sector'].astype(str).str.contains('Nan|Unknown|None', case=False)
+        df['is_incomplete'] = incomplete_mask
         self.stats["work_orders"]["incomplete"] = int(incomplete_mask.sum())
         
         return df
+
+    def refresh_stats(self, deals_df, work_orders_df):
+        """Recompute data-quality stats from the per-row flags on already cleaned frames."""
+        def flag_count(df, col):
+            return int(df[col].sum()) if col in df.columns else 0
+
+        self.stats = {
+            "deals": {
+                **self.stats["deals"],
+                "total_records": len(deals_df),
+                "missing_values": flag_count(deals_df, 'missing_deal_value'),
+                "missing_close_dates": flag_count(deals_df, 'missing_close_date'),
+            },
+            "work_orders": {
+                **self.stats["work_orders"],
+                "total_records": len(work_orders_df),
+                "missing_dates": flag_count(work_orders_df, 'missing_delivery_date'),
+                "delayed": flag_count(work_orders_df, 'is_delayed'),
+                "incomplete": flag_count(work_orders_df, 'is_incomplete'),
+            },
+        }
+        return self.stats
         
     def get_data_quality_report(self):
         return self.stats
@@ -1,85 +1,140 @@
-from fastapi import FastAPI, HTTPException
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request, Header, Query, Depends
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse, Response
 from pydantic import BaseModel
-import pandas as pd
-from monday_client import MondayClient
-from data_cleaner import DataCleaner
-from bi_engine import BIEngine
 from query_parser import QueryParser
-from report_generator import ReportGenerator
+from report_generator import ReportGenerator, report_key
+from tenants import TenantPool, UnknownTenantError, UnauthorizedError, DEFAULT_TENANT
+from metrics import REGISTRY, timed, start_request_timings, server_timing_header
 
-app = FastAPI(title="Monday BI Agent API")
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-monday_client = MondayClient()
+def _dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data)
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson when it is installed."""
+
+    def render(self, content):
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Monday BI Agent API", default_response_class=FastJSONResponse)
+# Large answers (reports, raw KPI dicts) are compressed; Starlette leaves text/event-stream alone.
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+tenant_pool = TenantPool.from_env()
 query_parser = QueryParser()
 
-class AppState:
-    deals_df = None
-    work_orders_df = None
-    data_cleaner = None
-    bi_engine = None
-    last_fetch = None
+REQUEST_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "Time to response headers per API route.", labels=("path", "status"))
 
-state = AppState()
+def _tenant_gauge(value):
+    def collect():
+        return {(t.tenant_id,): v for t in tenant_pool.tenants() if t.loaded and (v := value(t)) is not None}
+    return collect
 
-def refresh_data():
-    raw_deals = monday_client.fetch_board_data("Deals")
-    raw_wo = monday_client.fetch_board_data("Work Orders")
-    
-    cleaner = DataCleaner()
-    deals_df = cleaner.clean_deals_data(raw_deals)
-    wo_df = cleaner.clean_work_orders_data(raw_wo)
-    
-    state.deals_df = deals_df
-    state.work_orders_df = wo_df
-    state.data_cleaner = cleaner
-    state.bi_engine = BIEngine(deals_df, wo_df)
-    state.last_fetch = pd.Timestamp.now()
+REGISTRY.gauge("bi_data_age_seconds", "Seconds since a tenant's Monday boards were last refreshed.", labels=("tenant",), function=_tenant_gauge(lambda t: t.data_age()))
+REGISTRY.gauge("bi_tenant_memory_bytes", "Estimated memory held by a tenant's loaded boards.", labels=("tenant",), function=_tenant_gauge(lambda t: t.memory_bytes))
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(elapsed, path=getattr(route, "path", "unmatched"), status=response.status_code)
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+def _get_tenant(tenant_id, touch=True):
+    try:
+        return tenant_pool.get(tenant_id, touch=touch)
+    except UnknownTenantError:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant '{tenant_id}'.")
+
+def _authorized_tenant(authorization: Optional[str] = Header(None)):
+    """The tenant of the request's `Authorization: Bearer <token>`; clients never pick a tenant themselves."""
+    token = None
+    if authorization:
+        scheme, _, token = authorization.partition(" ")
+        token = token.strip()
+        if scheme.lower() != "bearer" or not token:
+            token = ""
+    try:
+        return tenant_pool.tenant_for_token(token)
+    except UnauthorizedError:
+        raise HTTPException(status_code=401, detail="Missing or invalid API token.", headers={"WWW-Authenticate": "Bearer"})
 
 class QueryRequest(BaseModel):
     query: str
 
-@app.on_event("startup")
-def startup_event():
-    if monday_client.api_key:
+def warm_up():
+    """Create the Gemini client and load the default tenant's boards (importing pandas on the way)."""
+    query_parser.client
+    tenant = tenant_pool.get(DEFAULT_TENANT)
+    if tenant.client.api_key:
          try:
-             refresh_data()
+             with tenant_pool.use(DEFAULT_TENANT):
+                 pass
          except Exception as e:
-             print(f"Startup fetch failed: {e}")
+             # Kept on the tenant as load_error and reported by /api/ready.
+             logger.error(f"Startup fetch failed: {e}")
 
-@app.post("/api/chat")
-def chat_endpoint(req: QueryRequest):
-        
-    if state.bi_engine is None:
-        try:
-            refresh_data()
-        except Exception as e:
-             return {"response": f"Failed to fetch data from Monday.com: {e}", "type": "error"}
+@app.on_event("startup")
+def startup_event():
+    if not os.environ.get("MONDAY_WEBHOOK_SECRET"):
+        logger.warning("MONDAY_WEBHOOK_SECRET is not set: /api/webhooks/monday rejects every event and boards only change on reload.")
+    # Off the critical path: uvicorn accepts connections right away and /api/ready says when data is in.
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+def _ensure_data(tenant):
+    try:
+        tenant_pool.ensure_loaded(tenant)
+    except Exception as e:
+         return {"response": f"Failed to fetch data from Monday.com: {e}", "type": "error"}
+    return None
 
-    query = req.query
+def _parse_intent(query):
     intent = query_parser.parse_query(query)
-    print("DEBUG INTENT:", intent)
+    logger.debug(f"Parsed intent: {intent}")
     
     if "error" in intent:
-        return {"response": "Error parsing query: " + intent["error"], "type": "error"}
+        return intent, {"response": "Error parsing query: " + intent["error"], "type": "error"}
         
+    if intent.get("metric_type", "ambiguous") == "ambiguous":
+        return intent, {"response": "Could you please clarify? I can answer about revenue, pipeline health, operations, or prepare a leadership update.", "type": "clarification"}
+    return intent, None
+
+def _metric_response(tenant, query, intent):
+    bi_engine, data_cleaner, data_version = tenant.view()
     metric_type = intent.get("metric_type", "ambiguous")
     sector = intent.get("sector", "all")
     timeframe = intent.get("timeframe", "all")
-    
-    if metric_type == "ambiguous":
-        return {"response": "Could you please clarify? I can answer about revenue, pipeline health, operations, or prepare a leadership update.", "type": "clarification"}
-        
-    if metric_type == "leadership_update":
-        rg = ReportGenerator(state.bi_engine, state.data_cleaner)
-        report = rg.generate_leadership_update(timeframe=timeframe, sector=sector)
-        return {"response": report, "type": "report"}
         
     response_text = ""
-    deals_kpis = state.bi_engine.deals_kpis(timeframe=timeframe, sector=sector)
-    wo_kpis = state.bi_engine.work_orders_kpis(timeframe=timeframe, sector=sector)
+    deals_kpis = bi_engine.deals_kpis(timeframe=timeframe, sector=sector)
+    wo_kpis = bi_engine.work_orders_kpis(timeframe=timeframe, sector=sector)
     
     warnings = []
-    dq = state.data_cleaner.get_data_quality_report()
+    dq = data_cleaner.get_data_quality_report()
     if dq['deals']['missing_close_dates'] > 0:
         warning_pct = dq['deals']['missing_close_dates'] / max(dq['deals']['total_records'], 1)
         if warning_pct > 0.1:
@@ -100,7 +155,7 @@ def chat_endpoint(req: QueryRequest):
         delayed = wo_kpis.get('delayed_projects', 0)
         response_text = f"There are {active} active projects, with {delayed} currently delayed."
     elif metric_type == "cross_board_insights" or "overload" in query.lower():
-        insight = state.bi_engine.cross_board_intelligence(timeframe=timeframe, sector=sector)
+        insight = bi_engine.cross_board_intelligence(timeframe=timeframe, sector=sector)
         response_text = f"Cross-board analysis: {insight.get('strategic_insight', '')}"
     elif metric_type == "general_health":
          rev = deals_kpis.get('closed_revenue', 0)
@@ -116,13 +171,231 @@ def chat_endpoint(req: QueryRequest):
         "response": response_text,
         "type": "text",
         "intent": intent,
-        "raw_data": {"deals": deals_kpis, "work_orders": wo_kpis}
+        "raw_data": {"deals": deals_kpis, "work_orders": wo_kpis},
+        "data_version": data_version
     }
 
+# Data versions restart with the process, so ETags from an earlier process (or another worker) must never match.
+_ETAG_SALT = os.urandom(8).hex()
+
+def _chat_etag(tenant, query, version):
+    """Weak ETag for an answer: the same normalized question on the same data gets the same answer."""
+    key = _dumps([_ETAG_SALT, tenant.tenant_id, " ".join(query.lower().split()), version])
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison: W/"x" and "x" match.
+    return "*" in candidates or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in candidates)
+
+def _not_modified(tenant, query, if_none_match):
+    """Answer a conditional request before any parsing or KPI work if the client's copy is current."""
+    if not if_none_match or not tenant.loaded:
+        return None
+    etag = _chat_etag(tenant, query, tenant.data_version)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+@app.post("/api/chat")
+def chat_endpoint(req: QueryRequest, tenant_id: str = Depends(_authorized_tenant), if_none_match: Optional[str] = Header(None)):
+    _get_tenant(tenant_id)
+    with tenant_pool.use(tenant_id, load=False) as tenant:
+        not_modified = _not_modified(tenant, req.query, if_none_match)
+        if not_modified is not None:
+            return not_modified
+
+        error = _ensure_data(tenant)
+        if error:
+            return error
+
+        query = req.query
+        intent, early = _parse_intent(query)
+        if early:
+            return early
+            
+        if intent.get("metric_type") == "leadership_update":
+            bi_engine, data_cleaner, version = tenant.view()
+            # Right after a webhook patch this may be the previous version's report, tagged as such.
+            report, version = tenant.reports.get_or_render(bi_engine, data_cleaner, intent.get("sector", "all"), intent.get("timeframe", "all"), version)
+            body = {"response": report, "type": "report", "data_version": version}
+        else:
+            body = _metric_response(tenant, query, intent)
+        # Returned as a response object so FastAPI skips jsonable_encoder on the KPI dicts.
+        etag = _chat_etag(tenant, query, body["data_version"])
+        return FastJSONResponse(body, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {_dumps(data)}\n\n"
+
+def _chat_events(tenant_id, query):
+    with tenant_pool.use(tenant_id, load=False) as tenant:
+        error = _ensure_data(tenant)
+        if error:
+            yield _sse("message", error)
+            yield _sse("done", {})
+            return
+
+        intent, early = _parse_intent(query)
+        etag = None
+        if early:
+            yield _sse("message", early)
+        elif intent.get("metric_type") == "leadership_update":
+            sector, timeframe = intent.get("sector", "all"), intent.get("timeframe", "all")
+            bi_engine, data_cleaner, version = tenant.view()
+            report, report_version = tenant.reports.lookup(sector, timeframe, version)
+            yield _sse("meta", {"type": "report", "intent": intent, "data_version": report_version or version})
+            if report is not None:
+                version = report_version
+                sections = report.items()
+            else:
+                rg = ReportGenerator(bi_engine, data_cleaner)
+                sections = rg.iter_leadership_update(timeframe=timeframe, sector=sector)
+            rendered = {}
+            with timed("stream_leadership_update"):
+                for name, value in sections:
+                    rendered[name] = value
+                    yield _sse("section", {"name": name, "value": value})
+            if report is None:
+                tenant.reports.put(sector, timeframe, version, rendered)
+            etag = _chat_etag(tenant, query, version)
+        else:
+            answer = _metric_response(tenant, query, intent)
+            yield _sse("message", answer)
+            etag = _chat_etag(tenant, query, answer["data_version"])
+        # Headers went out before the answer existed, so the ETag for conditional re-asks rides on `done`.
+        yield _sse("done", {"etag": etag} if etag else {})
+
+@app.post("/api/chat/stream")
+def chat_stream_endpoint(req: QueryRequest, tenant_id: str = Depends(_authorized_tenant), if_none_match: Optional[str] = Header(None)):
+    """Server-sent events variant of /api/chat; leadership updates are emitted one section per event."""
+    tenant = _get_tenant(tenant_id)
+    not_modified = _not_modified(tenant, req.query, if_none_match)
+    if not_modified is not None:
+        return not_modified
+    return StreamingResponse(
+        _chat_events(tenant_id, req.query),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _encode_cursor(after, query):
+    state = json.dumps({"after": after, "query": query}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(state.encode()).decode()
+
+def _decode_cursor(cursor, query):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        key, item_id = state["after"]
+        after = [None if key is None else float(key), str(item_id)]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if state.get("query") != query:
+        raise HTTPException(status_code=400, detail="Cursor belongs to a different drill-down query.")
+    return after
+
+def _drilldown(tenant_id, query, cursor, limit, fetch):
+    """Serve one page from the tenant's drill-down indexes; the cursor holds the sort key and id of the last row served."""
+    after = _decode_cursor(cursor, query) if cursor else None
+    with tenant_pool.use(tenant_id, load=False) as tenant:
+        error = _ensure_data(tenant)
+        if error:
+            raise HTTPException(status_code=503, detail=error["response"])
+        bi_engine, _, version = tenant.view()
+        try:
+            # Outside the tenant lock: an engine's frames are never patched in place, and the first
+            # page after a webhook change builds that engine's indexes without holding up webhooks.
+            page = fetch(bi_engine, after, limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    next_key = page.pop("next")
+    page["next_cursor"] = _encode_cursor(next_key, query) if next_key is not None else None
+    page["data_version"] = version
+    return page
+
+@app.get("/api/drilldown/deals")
+def drilldown_deals(sector: str = "all", timeframe: str = "all", sort: str = "value",
+                    limit: int = Query(20, ge=1, le=200), cursor: Optional[str] = None,
+                    tenant_id: str = Depends(_authorized_tenant)):
+    """Open deals behind the pipeline, largest first by `value` or `weighted_value`."""
+    sector, timeframe = report_key(sector, timeframe)
+    return _drilldown(tenant_id, ["deals", sector, timeframe, sort], cursor, limit,
+                      lambda bi, after, limit: bi.top_open_deals(sector, timeframe, sort, after, limit))
+
+@app.get("/api/drilldown/work-orders")
+def drilldown_work_orders(sector: str = "all", timeframe: str = "all",
+                          limit: int = Query(20, ge=1, le=200), cursor: Optional[str] = None,
+                          tenant_id: str = Depends(_authorized_tenant)):
+    """Delayed work orders, most overdue first."""
+    sector, timeframe = report_key(sector, timeframe)
+    return _drilldown(tenant_id, ["work_orders", sector, timeframe], cursor, limit,
+                      lambda bi, after, limit: bi.delayed_work_orders(sector, timeframe, after, limit))
+
+@app.get("/api/data-version")
+def data_version_endpoint(tenant_id: str = Depends(_authorized_tenant)):
+    """Cheap probe of the data version answers are computed from; never triggers a load."""
+    tenant = _get_tenant(tenant_id, touch=False)
+    return {"data_version": tenant.data_version if tenant.loaded else None}
+
+@app.post("/api/webhooks/monday")
+@app.post("/api/webhooks/monday/{tenant_id}")
+def monday_webhook(payload: dict, tenant_id: str = DEFAULT_TENANT, token: Optional[str] = None):
+    """Receive Monday item events and patch the in-memory boards instead of re-downloading them."""
+    secret = os.environ.get("MONDAY_WEBHOOK_SECRET")
+    if not secret:
+        # Events rewrite the KPIs leadership sees and trigger Monday fetches, so they are never taken unauthenticated.
+        raise HTTPException(status_code=403, detail="Webhooks are disabled until MONDAY_WEBHOOK_SECRET is set.")
+    if not hmac.compare_digest((token or "").encode(), secret.encode()):
+        raise HTTPException(status_code=401, detail="Invalid webhook token.")
+    if "challenge" in payload:
+        # Monday verifies a new webhook URL by expecting its challenge echoed back.
+        return {"challenge": payload["challenge"]}
+    tenant = _get_tenant(tenant_id, touch=False)
+    result = tenant.webhook_processor.handle(payload)
+    if result == "applied":
+        # Created items grow the tenant's boards; keep the pool within its memory budget.
+        tenant_pool.enforce_budget()
+    elif result == "not_loaded":
+        # The tenant's boards are evicted or not loaded yet; make sure they are re-fetched, not restored.
+        tenant_pool.invalidate_snapshot(tenant)
+    return {"status": result, "data_version": tenant.data_version}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/api/ready")
+def readiness_check(authorization: Optional[str] = Header(None)):
+    """200 once both of the tenant's boards have loaded and queries can be answered, 503 until then.
+
+    A tenant evicted to stay within the memory budget is still ready: its next query reloads it.
+    Health checks carry no token, so without one this reports on the default tenant.
+    """
+    tenant = _get_tenant(_authorized_tenant(authorization) if authorization else DEFAULT_TENANT, touch=False)
+    loaded = tenant.loaded and all(tenant.board_ids.values())
+    body = {
+        "status": "ready" if loaded else "evicted" if tenant.evicted else "loading",
+        "tenant": tenant.tenant_id,
+        "data_version": tenant.data_version if tenant.loaded else None,
+        "data_age_seconds": tenant.data_age(),
+    }
+    if loaded or (tenant.evicted and not tenant.load_error):
+        return body
+    if tenant.load_error:
+        body.update(status="error", detail=f"Loading boards failed: {tenant.load_error}")
+    elif tenant.loaded:
+        missing = [kind for kind, board_id in tenant.board_ids.items() if not board_id]
+        body.update(status="error", detail=f"Boards not found: {', '.join(missing)}.")
+    elif not tenant.client.api_key:
+        body.update(status="error", detail="No Monday API key configured for this tenant.")
+    return JSONResponse(status_code=503, content=body)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,14 +1,111 @@
+import json
 import os
+import re
 import requests
 import time
 import logging
+from metrics import REGISTRY, timed, timed_stage, record_cache
+
+try:
+    # Picks its fastest available backend (the yajl2 C extension when installed).
+    import ijson
+except ImportError:
+    ijson = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PAGE_SIZE = 500
+
+# Asking for complexity alongside data lets us track rate-limit headroom at no extra cost.
+COMPLEXITY_FIELDS = "complexity { before after reset_in_x_seconds }"
+
+MONDAY_REQUESTS = REGISTRY.counter("monday_requests_total", "Monday API HTTP requests by status code.", labels=("status",))
+MONDAY_COMPLEXITY_REMAINING = REGISTRY.gauge("monday_complexity_remaining", "Monday complexity budget left after the last query.")
+MONDAY_COMPLEXITY_RESET = REGISTRY.gauge("monday_complexity_reset_seconds", "Seconds until the Monday complexity budget resets.")
+
+ITEM_FIELDS = """
+                        id
+                        name
+                        column_values {
+                            id
+                            text
+                            type
+                            value
+                            column {
+                                title
+                            }
+                        }
+                    """
+
+class MondayAPIError(RuntimeError):
+    """A board could not be read from Monday in full."""
+
+# A top-level "errors" key. Item text is always inside JSON strings, where quotes are escaped, so it never matches.
+_ERRORS_KEY = re.compile(rb'"errors"\s*:')
+
+class _BodyReader:
+    """File-like view of a streamed response body that keeps copies of its first and last bytes."""
+
+    def __init__(self, chunks, head_size=16 * 1024, tail_size=64 * 1024):
+        self._chunks = chunks
+        self._pending = b""
+        self.head = bytearray()
+        self.head_size = head_size
+        self.tail = b""
+        self.tail_size = tail_size
+
+    def read(self, size=-1):
+        if not self._pending:
+            self._pending = next(self._chunks, b"")
+        # Never hand back more than was asked for: ijson reads into fixed-size buffers.
+        size = len(self._pending) if size is None or size < 0 else size
+        data, self._pending = self._pending[:size], self._pending[size:]
+        if len(self.head) < self.head_size:
+            self.head += data[:self.head_size - len(self.head)]
+        self.tail = (self.tail + data)[-self.tail_size:]
+        return data
+
+def _page_metadata(head, tail, page_path):
+    """Pull errors, complexity and the cursor out of the start and end of a page response.
+
+    The queries select complexity and cursor before items, so both precede the item list.
+    GraphQL `errors` sit at the top level, before `data` (in the head) or after it (in the tail).
+    """
+    meta = {"errors": None, "complexity": None, "cursor": None}
+    paths = {"errors": "errors", "data.complexity": "complexity", f"{page_path}.cursor": "cursor"}
+    item_path = f"{page_path}.items.item"
+    builder, building = None, None
+    try:
+        for path, event, value in ijson.parse(head, use_float=True):
+            if building is not None:
+                builder.event(event, value)
+                if path == building and event in ("end_map", "end_array"):
+                    meta[paths[building]] = builder.value
+                    builder, building = None, None
+            elif path == item_path:
+                break
+            elif path in paths and event in ("start_map", "start_array"):
+                builder, building = ijson.ObjectBuilder(), path
+                builder.event(event, value)
+            elif path in paths and event in ("string", "number", "null"):
+                meta[paths[path]] = value
+    except ijson.IncompleteJSONError:
+        # The head was cut inside the item list; everything we need came before it.
+        pass
+
+    match = None if meta["errors"] else _ERRORS_KEY.search(tail)
+    if match:
+        text = tail[match.end():].decode(errors="replace").lstrip()
+        try:
+            meta["errors"] = json.JSONDecoder().raw_decode(text)[0]
+        except ValueError:
+            meta["errors"] = text[:500]
+    return meta
+
 class MondayClient:
-    def __init__(self):
-        self.api_key = os.environ.get("MONDAY_API_KEY")
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.environ.get("MONDAY_API_KEY")
         if not self.api_key:
             logger.warning("MONDAY_API_KEY environment variable not set. API calls will fail.")
         self.headers = {
@@ -16,31 +113,26 @@ class MondayClient:
             "API-Version": "2023-10", 
             "Content-Type": "application/json"
         }
-        self.url = "https://api.monday.com/v2"
+        self.url = os.environ.get("MONDAY_API_URL", "https://api.monday.com/v2")
         self.boards = {} # Cache for board names to IDs
+        # Decode item pages incrementally from the socket instead of via response.json().
+        self.stream_decode = ijson is not None and os.environ.get("MONDAY_STREAM_DECODE", "1") != "0"
 
-    def execute_query(self, query, variables=None, retries=3, backoff_factor=1.5):
-        payload = {"query": query}
-        if variables:
-            payload["variables"] = variables
-            
+    def _post(self, payload, stream=False, retries=3, backoff_factor=1.5):
+        """POST a GraphQL payload, retrying rate limits and transport errors. Returns the response or None."""
         for attempt in range(retries):
             try:
-                response = requests.post(self.url, json=payload, headers=self.headers, timeout=15)
+                response = requests.post(self.url, json=payload, headers=self.headers, timeout=15, stream=stream)
+                MONDAY_REQUESTS.inc(status=response.status_code)
                 # Check rate limits
                 if response.status_code == 429:
                     logger.warning("Monday API rate limit hit. Retrying...")
+                    response.close()
                     time.sleep(backoff_factor ** attempt)
                     continue
                     
                 response.raise_for_status()
-                data = response.json()
-                
-                if "errors" in data:
-                    logger.error(f"GraphQL Errors: {data['errors']}")
-                    return None
-                    
-                return data.get("data")
+                return response
 
             except requests.exceptions.RequestException as e:
                 logger.error(f"Request failed: {e}")
@@ -53,6 +145,74 @@ class MondayClient:
                     return None
         return None
 
+    def _record_complexity(self, complexity):
+        if complexity:
+            MONDAY_COMPLEXITY_REMAINING.set(complexity.get("after", 0))
+            MONDAY_COMPLEXITY_RESET.set(complexity.get("reset_in_x_seconds", 0))
+
+    @timed_stage("execute_query")
+    def execute_query(self, query, variables=None, retries=3, backoff_factor=1.5):
+        payload = {"query": query}
+        if variables:
+            payload["variables"] = variables
+
+        response = self._post(payload, retries=retries, backoff_factor=backoff_factor)
+        if response is None:
+            return None
+        try:
+            data = response.json()
+        except ValueError as e:
+            logger.error(f"Invalid JSON from Monday API: {e}")
+            return None
+
+        if "errors" in data:
+            logger.error(f"GraphQL Errors: {data['errors']}")
+            return None
+
+        self._record_complexity((data.get("data") or {}).get("complexity"))
+        return data.get("data")
+
+    def _stream_page(self, query, variables, page_path):
+        """Yield the items of one page as they are decoded from the response body.
+
+        The generator returns (ok, next cursor); ok is False when the request failed, the body
+        was truncated or it carried GraphQL errors.
+        """
+        payload = {"query": query, "variables": variables}
+        with timed("execute_query"):
+            response = self._post(payload, stream=True)
+        if response is None:
+            return False, None
+
+        with response:
+            body = _BodyReader(response.iter_content(chunk_size=64 * 1024))
+            try:
+                # Items are built one at a time by ijson's C backend as chunks arrive; the page as a whole is never materialized.
+                yield from ijson.items(body, f"{page_path}.items.item", use_float=True)
+            except (ijson.JSONError, requests.exceptions.RequestException) as e:
+                logger.error(f"Streaming decode of Monday response failed: {e}")
+                return False, None
+
+        meta = _page_metadata(bytes(body.head), body.tail, page_path)
+        if meta["errors"]:
+            logger.error(f"GraphQL Errors: {meta['errors']}")
+            return False, None
+        self._record_complexity(meta["complexity"])
+        return True, meta["cursor"]
+
+    def _fetch_page(self, query, variables, page_path):
+        """Buffered counterpart of _stream_page, used when ijson is unavailable or streaming is disabled."""
+        page = self.execute_query(query, variables=variables)
+        # page_path uses ijson's notation: "item" stands for the (first) element of a list.
+        for key in page_path.split(".")[1:]:
+            if not page:
+                break
+            page = page[0] if key == "item" else page.get(key)
+        if not page:
+            return False, None
+        yield from page.get("items") or []
+        return True, page.get("cursor")
+
     def get_boards(self):
         query = """
         query {
@@ -68,54 +228,78 @@ class MondayClient:
             return self.boards
         return {}
 
-    def fetch_board_data(self, board_name):
+    def resolve_board_id(self, board_name):
         # Allow case-insensitive search
+        record_cache("board_ids", bool(self.boards))
         if not self.boards:
             self.get_boards()
             
-        board_id = None
         search_terms = [board_name.lower(), board_name.lower().rstrip('s'), board_name.lower().split()[0]]
         
         for name, bids in self.boards.items():
             name_lower = name.lower()
             if any(term in name_lower for term in search_terms):
-                board_id = bids
-                break
-                
+                return bids
+        return None
+
+    def fetch_board_data(self, board_name):
+        """Every item of a board as a list; raises MondayAPIError rather than return part of it."""
+        return list(self.iter_board_items(board_name))
+
+    def iter_board_items(self, board_name, board_id=None):
+        """Yield every item of a board, following the items_page cursor, as soon as each is decoded.
+
+        Raises MondayAPIError if the board is not found or a page fails, after yielding the items
+        decoded so far, so a caller never takes a short board for the whole one.
+        """
+        board_id = board_id or self.resolve_board_id(board_name)
         if not board_id:
-            logger.error(f"Board '{board_name}' not found.")
-            return None
+            raise MondayAPIError(f"Board '{board_name}' not found.")
 
-        # Fetch board items and column values dynamically
+        # Fetch board items and column values dynamically, following the items_page cursor
         query = """
         query ($boardId: [ID!]) {
+            %s
             boards (ids: $boardId) {
                 name
-                items_page (limit: 500) {
-                    items {
-                        id
-                        name
-                        column_values {
-                            id
-                            text
-                            type
-                            value
-                            column {
-                                title
-                            }
-                        }
-                    }
+                items_page (limit: %d) {
+                    cursor
+                    items {%s}
                 }
             }
         }
-        """
-        variables = {"boardId": str(board_id)}
-        data = self.execute_query(query, variables=variables)
+        """ % (COMPLEXITY_FIELDS, PAGE_SIZE, ITEM_FIELDS)
+        next_query = """
+        query ($cursor: String!) {
+            %s
+            next_items_page (limit: %d, cursor: $cursor) {
+                cursor
+                items {%s}
+            }
+        }
+        """ % (COMPLEXITY_FIELDS, PAGE_SIZE, ITEM_FIELDS)
+
+        fetch_page = self._stream_page if self.stream_decode else self._fetch_page
+        ok, cursor = yield from fetch_page(query, {"boardId": str(board_id)}, "data.boards.item.items_page")
+        pages = 1
+        while ok and cursor:
+            ok, cursor = yield from fetch_page(next_query, {"cursor": cursor}, "data.next_items_page")
+            pages += 1
+        if not ok:
+            raise MondayAPIError(f"Fetching board '{board_name}' failed at page {pages}.")
         
-        if data and data.get("boards") and len(data["boards"]) > 0:
-            return data["boards"][0]["items_page"]["items"]
+    def fetch_items(self, item_ids):
+        """Fetch specific items (e.g. ones named in a webhook event) with their column values."""
+        query = """
+        query ($ids: [ID!]) {
+            items (ids: $ids) {%s}
+        }
+        """ % ITEM_FIELDS
+        data = self.execute_query(query, variables={"ids": [str(i) for i in item_ids]})
+        if data and data.get("items"):
+            return data["items"]
         return []
-        
+
     def validate_connection(self):
         """Validate connection by fetching boards."""
         if not self.api_key:
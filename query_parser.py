@@ -1,8 +1,8 @@
 import os
 import json
 import logging
-from google import genai
 from pydantic import BaseModel, Field
+from metrics import timed_stage
 
 logger = logging.getLogger(__name__)
 
@@ -11,15 +11,31 @@ class QueryIntent(BaseModel):
     sector: str = Field(description='The specific sector mentioned, or "all" if none.', default="all")
     timeframe: str = Field(description='The specific timeframe mentioned ("this_month", "this_quarter", "this_year", "all")', default="all")
 
+_UNSET = object()
+
 class QueryParser:
     def __init__(self):
         self.api_key = os.environ.get("GEMINI_API_KEY")
-        if self.api_key:
-            self.client = genai.Client(api_key=self.api_key)
-        else:
-            self.client = None
+        self._client = _UNSET
+        if not self.api_key:
             logger.warning("GEMINI_API_KEY not set. Query parsing will fail.")
 
+    @property
+    def client(self):
+        """The Gemini client, created on first use: importing google.genai alone takes a noticeable part of startup."""
+        if self._client is _UNSET:
+            if self.api_key:
+                from google import genai
+                self._client = genai.Client(api_key=self.api_key)
+            else:
+                self._client = None
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @timed_stage("parse_query")
     def parse_query(self, query: str):
         if not self.client:
             return self._fallback_parse(query)
@@ -34,6 +50,7 @@ class QueryParser:
         - For `sector`, extract the exact capitalization if it mentions Aviation, Construction, Dsp, Manufacturing, Mining, Powerline, Railways, Renewables, Security And Surveillance, or Tender. Otherwise, return "all".
         """
         
+        from google import genai
         try:
             response = self.client.models.generate_content(
                 model='gemini-2.5-flash',
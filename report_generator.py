@@ -1,29 +1,75 @@
+import threading
+import logging
+from metrics import timed_stage, record_cache
+
+logger = logging.getLogger(__name__)
+
+PRERENDER_TIMEFRAMES = ["all", "this_month", "this_quarter", "this_year"]
+
+REPORT_SECTIONS = [
+    "title",
+    "revenue_summary",
+    "pipeline_health",
+    "sector_breakdown",
+    "operational_status",
+    "risk_flags",
+    "data_quality_warnings",
+    "metrics",
+]
+
+def report_key(sector="all", timeframe="all"):
+    """Normalize a (sector, timeframe) pair the same way BIEngine filters on it."""
+    tf = (timeframe or "all").lower()
+    if 'month' in tf:
+        tf = "this_month"
+    elif 'quarter' in tf:
+        tf = "this_quarter"
+    elif 'year' in tf:
+        tf = "this_year"
+    else:
+        tf = "all"
+    return (sector or "all").strip().lower(), tf
+
 class ReportGenerator:
     def __init__(self, bi_engine, data_cleaner):
         self.bi = bi_engine
         self.cleaner = data_cleaner
 
+    @timed_stage("generate_leadership_update")
     def generate_leadership_update(self, timeframe="all", sector="all"):
+        return dict(self.iter_leadership_update(timeframe=timeframe, sector=sector))
+
+    def iter_leadership_update(self, timeframe="all", sector="all"):
+        """Yield (section, value) pairs in REPORT_SECTIONS order as soon as each one is computed."""
+        yield "title", "Leadership Update"
+
         deals_kpis = self.bi.deals_kpis(timeframe=timeframe, sector=sector)
-        wo_kpis = self.bi.work_orders_kpis(timeframe=timeframe, sector=sector)
-        data_quality = self.cleaner.get_data_quality_report()
-        
         rev = deals_kpis.get('closed_revenue', 0)
         pipe = deals_kpis.get('open_pipeline_value', 0)
         win_rate = deals_kpis.get('win_rate', 0)
-        
+
+        yield "revenue_summary", f"Closed Revenue: ${rev:,.2f} | Win Rate: {win_rate:.1%}"
+        yield "pipeline_health", f"Open Pipeline: ${pipe:,.2f}"
+        yield "sector_breakdown", deals_kpis.get('revenue_by_sector', {})
+
+        wo_kpis = self.bi.work_orders_kpis(timeframe=timeframe, sector=sector)
         active = wo_kpis.get('active_projects', 0)
         delayed = wo_kpis.get('delayed_projects', 0)
-        
+
+        yield "operational_status", f"Active Projects: {active} | Delayed Projects: {delayed}"
+
         risk_flags = []
         if delayed > 0 and (delayed/max(active, 1) > 0.2):
             risk_flags.append(f"High risk of operational delay ({delayed} delayed projects).")
         if win_rate < 0.2 and deals_kpis.get('stage_distribution', {}).get('Closed Won', 0) > 0:
             risk_flags.append(f"Win rate is critically low at {win_rate:.1%}.")
-            
+
+        yield "risk_flags", risk_flags if risk_flags else ["No critical risk flags detected."]
+
+        data_quality = self.cleaner.get_data_quality_report()
         deals_hq = data_quality['deals']
         wo_hq = data_quality['work_orders']
-        
+
         warning_texts = []
         if deals_hq['missing_close_dates'] > (deals_hq['total_records'] * 0.1):
             warning_texts.append(f"⚠ {deals_hq['missing_close_dates']} deals missing close dates.")
@@ -31,14 +77,84 @@ class ReportGenerator:
              warning_texts.append(f"⚠ {deals_hq['missing_values']} deals missing revenue numbers. Pipeline may be conservative.")
         if wo_hq['incomplete'] > (wo_hq['total_records'] * 0.1):
             warning_texts.append(f"⚠ {wo_hq['incomplete']} incomplete work order records detected.")
-            
-        report = {
-            "title": "Leadership Update",
-            "revenue_summary": f"Closed Revenue: ${rev:,.2f} | Win Rate: {win_rate:.1%}",
-            "pipeline_health": f"Open Pipeline: ${pipe:,.2f}",
-            "sector_breakdown": deals_kpis.get('revenue_by_sector', {}),
-            "operational_status": f"Active Projects: {active} | Delayed Projects: {delayed}",
-            "risk_flags": risk_flags if risk_flags else ["No critical risk flags detected."],
-            "data_quality_warnings": warning_texts if warning_texts else ["Data quality is within acceptable bounds."]
+
+        yield "data_quality_warnings", warning_texts if warning_texts else ["Data quality is within acceptable bounds."]
+
+        # The same numbers as the display strings above, so clients never have to parse them back.
+        yield "metrics", {
+            "closed_revenue": rev,
+            "win_rate": win_rate,
+            "open_pipeline_value": pipe,
+            "weighted_pipeline": deals_kpis.get('weighted_pipeline', 0),
+            "active_projects": active,
+            "delayed_projects": delayed,
         }
-        return report
+
+class ReportCache:
+    """Leadership reports for every known sector x standard timeframe, keyed to one data version.
+
+    prerender() builds the whole set after a refresh, and again shortly after webhook patches.
+    While a newer set is being rendered (see mark_stale), lookups keep getting the previous
+    set's reports, tagged with the version they were computed from.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.pending_version = None
+        self._reports = {}
+        self._lock = threading.Lock()
+
+    def mark_stale(self, version):
+        """Record that a set for `version` is on its way, so the current set may be served until then."""
+        with self._lock:
+            self.pending_version = max(self.pending_version or 0, version)
+
+    def lookup(self, sector, timeframe, version):
+        """Return (report, the data version it was computed from), or (None, None) on a miss."""
+        key = report_key(sector, timeframe)
+        with self._lock:
+            report = self._reports.get(key)
+            if self.version == version:
+                found = report, self.version
+            elif report is not None and self.version is not None and self.version < version <= (self.pending_version or 0):
+                found = report, self.version
+            else:
+                found = None, None
+        record_cache("reports", found[0] is not None)
+        return found
+
+    def put(self, sector, timeframe, version, report):
+        with self._lock:
+            if self.version != version:
+                if self.version is not None and version < self.version:
+                    return
+                if self._reports and self.pending_version is not None and version <= self.pending_version:
+                    # The current set is served until the re-render lands; one report isn't worth dropping it.
+                    return
+                self.version, self._reports = version, {}
+            self._reports[report_key(sector, timeframe)] = report
+
+    def get_or_render(self, bi_engine, data_cleaner, sector, timeframe, version):
+        """Return (report, data version), rendering and caching the report for `version` on a miss."""
+        report, report_version = self.lookup(sector, timeframe, version)
+        if report is None:
+            report, report_version = ReportGenerator(bi_engine, data_cleaner).generate_leadership_update(timeframe=timeframe, sector=sector), version
+            self.put(sector, timeframe, version, report)
+        return report, report_version
+
+    @timed_stage("prerender_reports")
+    def prerender(self, bi_engine, data_cleaner, sectors, version):
+        rg = ReportGenerator(bi_engine, data_cleaner)
+        reports = {}
+        for sector in ["all", *sorted({str(s).strip().lower() for s in sectors} - {"all"})]:
+            for timeframe in PRERENDER_TIMEFRAMES:
+                reports[report_key(sector, timeframe)] = rg.generate_leadership_update(timeframe=timeframe, sector=sector)
+        with self._lock:
+            if self.version is not None and version < self.version:
+                return
+            if self.version == version:
+                # Keep anything rendered lazily while we were working.
+                reports.update(self._reports)
+            self.version, self._reports = version, reports
+            if self.pending_version is not None and self.pending_version <= version:
+                self.pending_version = None
@@ -0,0 +1,415 @@
+import hmac
+import json
+import logging
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from monday_client import MondayClient
+from report_generator import ReportCache
+from metrics import REGISTRY, timed_stage, record_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+TENANT_LOADS = REGISTRY.counter("bi_tenant_loads_total", "Tenant data loads by source (monday/snapshot).", labels=("source",))
+# After a webhook patch, reports are re-rendered once this many seconds have passed, covering
+# every patch that lands in between; until then the previous set keeps being served.
+PRERENDER_DELAY_SECONDS = float(os.environ.get("REPORT_PRERENDER_DELAY", 2.0))
+
+TENANT_EVICTIONS = REGISTRY.counter("bi_tenant_evictions_total", "Tenants whose data was evicted to stay within the memory budget.")
+
+class UnknownTenantError(KeyError):
+    pass
+
+class UnauthorizedError(Exception):
+    pass
+
+def row_memory(row):
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+
+def frame_memory(df):
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+def _rows_memory(rows):
+    return sum(row_memory(row) for row in rows.values())
+
+class TenantState:
+    """Everything one Monday account needs to answer queries: its client, cleaned boards and BI engine."""
+
+    def __init__(self, tenant_id, client):
+        self.tenant_id = tenant_id
+        self.client = client
+        self.lock = threading.RLock()
+        self.in_use = 0
+        # True once evicted to stay within the memory budget, until the next load: the data is reloadable.
+        self.evicted = False
+        # Why the last attempt to load the boards failed, until one succeeds.
+        self.load_error = None
+        self.last_used = time.monotonic()
+        self.memory_bytes = 0
+        self.data_version = 0
+        self._reset_data()
+        self._webhook_processor = None
+        # Set while a re-render is scheduled or running; at most one runs at a time.
+        self._prerender_timer = None
+        # Patches that landed after the running re-render took its view; they get one trailing run.
+        self._prerender_dirty = False
+
+    def _reset_data(self):
+        self.deals_df = None
+        self.work_orders_df = None
+        self.data_cleaner = None
+        self.bi_engine = None
+        self.last_fetch = None
+        self.board_ids = {"deals": None, "work_orders": None}
+        # Flat item rows by id, kept so webhook events can be re-cleaned without re-downloading boards.
+        self.rows = {"deals": {}, "work_orders": {}}
+        self.column_titles = {"deals": {}, "work_orders": {}}
+        self.reports = ReportCache()
+        self.memory_bytes = 0
+
+    @property
+    def loaded(self):
+        return self.bi_engine is not None
+
+    @property
+    def webhook_processor(self):
+        with self.lock:
+            if self._webhook_processor is None:
+                from webhooks import MondayWebhookProcessor
+                self._webhook_processor = MondayWebhookProcessor(self, self.client)
+            return self._webhook_processor
+
+    def view(self):
+        """The engine, cleaner and data version read together, so one answer never mixes two versions."""
+        with self.lock:
+            return self.bi_engine, self.data_cleaner, self.data_version
+
+    def data_age(self):
+        if self.last_fetch is None:
+            return None
+        return (datetime.now() - self.last_fetch).total_seconds()
+
+    @timed_stage("refresh_data")
+    def refresh(self):
+        # pandas and the modules built on it are only imported once a tenant actually loads data,
+        # so the API process starts (and answers /api/health) without paying for them.
+        from data_cleaner import DataCleaner
+        from bi_engine import BIEngine
+
+        cleaner = DataCleaner()
+        column_titles = {"deals": {}, "work_orders": {}}
+        # Items are flattened as they are decoded, so raw pages are never held for a whole board.
+        deal_rows = cleaner._extract_column_dicts(self.client.iter_board_items("Deals"), column_titles["deals"])
+        wo_rows = cleaner._extract_column_dicts(self.client.iter_board_items("Work Orders"), column_titles["work_orders"])
+        deals_df = cleaner.clean_deals_rows(deal_rows)
+        wo_df = cleaner.clean_work_orders_rows(wo_rows)
+        bi_engine = BIEngine(deals_df, wo_df)
+        bi_engine.build_indexes()
+
+        with self.lock:
+            self.deals_df = deals_df
+            self.work_orders_df = wo_df
+            self.data_cleaner = cleaner
+            self.bi_engine = bi_engine
+            self.last_fetch = datetime.now()
+            self.rows = {"deals": {r["id"]: r for r in deal_rows}, "work_orders": {r["id"]: r for r in wo_rows}}
+            self.column_titles = column_titles
+            self.board_ids = {"deals": self.client.resolve_board_id("Deals"), "work_orders": self.client.resolve_board_id("Work Orders")}
+            self.data_version += 1
+            self.memory_bytes = self.estimate_memory()
+            self.evicted = False
+            self._forget_webhook_order()
+        TENANT_LOADS.inc(source="monday")
+        self.prerender_reports()
+
+    def known_sectors(self):
+        sectors = set()
+        for df in (self.deals_df, self.work_orders_df):
+            if df is not None and 'sector' in df.columns:
+                sectors.update(str(s) for s in df['sector'].dropna().unique())
+        return sectors
+
+    def prerender_reports(self):
+        """Build leadership reports for every sector x standard timeframe in the background."""
+        self._request_prerender(0)
+
+    def schedule_prerender(self):
+        """Re-render reports, and warm the drill-down indexes, shortly after a webhook patch."""
+        with self.lock:
+            self.reports.mark_stale(self.data_version)
+        self._request_prerender(PRERENDER_DELAY_SECONDS)
+
+    def _request_prerender(self, delay):
+        with self.lock:
+            if self._prerender_timer is not None:
+                self._prerender_dirty = True
+                return
+            timer = self._prerender_timer = threading.Timer(delay, self._scheduled_prerender)
+        timer.daemon = True
+        timer.start()
+
+    def _scheduled_prerender(self):
+        with self.lock:
+            # Patches from here on are not in this run's view; they leave the flag set for a trailing run.
+            self._prerender_dirty = False
+            loaded = self.loaded
+            if loaded:
+                bi_engine, data_cleaner, data_version = self.view()
+                sectors, reports = self.known_sectors(), self.reports
+        try:
+            if loaded:
+                bi_engine.indexes()
+                reports.prerender(bi_engine, data_cleaner, sectors, data_version)
+        except Exception as e:
+            logger.warning(f"Re-rendering leadership reports for tenant '{self.tenant_id}' failed: {e}")
+        finally:
+            with self.lock:
+                # Cleared only now, so a full re-render never overlaps the previous one.
+                self._prerender_timer = None
+                trailing = self._prerender_dirty and self.loaded
+            if trailing:
+                self._request_prerender(PRERENDER_DELAY_SECONDS)
+
+    def estimate_memory(self):
+        frames = sum(frame_memory(df) for df in (self.deals_df, self.work_orders_df) if df is not None)
+        return frames + sum(_rows_memory(rows) for rows in self.rows.values())
+
+    def snapshot(self, path):
+        """Spill the loaded boards to disk so an evicted tenant can come back without a Monday fetch."""
+        with self.lock:
+            payload = {
+                "deals_df": self.deals_df,
+                "work_orders_df": self.work_orders_df,
+                "stats": self.data_cleaner.stats,
+                "last_fetch": self.last_fetch,
+                "board_ids": self.board_ids,
+                "rows": self.rows,
+                "column_titles": self.column_titles,
+                "data_version": self.data_version,
+            }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def restore(self, path):
+        from data_cleaner import DataCleaner
+        from bi_engine import BIEngine
+
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+        cleaner = DataCleaner()
+        cleaner.stats = payload["stats"]
+        bi_engine = BIEngine(payload["deals_df"], payload["work_orders_df"])
+        bi_engine.build_indexes()
+        with self.lock:
+            self.deals_df = payload["deals_df"]
+            self.work_orders_df = payload["work_orders_df"]
+            self.data_cleaner = cleaner
+            self.bi_engine = bi_engine
+            self.last_fetch = payload["last_fetch"]
+            self.board_ids = payload["board_ids"]
+            self.rows = payload["rows"]
+            self.column_titles = payload["column_titles"]
+            # Same data, same version: clients holding answers for this version stay valid.
+            self.data_version = max(self.data_version, payload["data_version"])
+            self.memory_bytes = self.estimate_memory()
+            self.evicted = False
+        TENANT_LOADS.inc(source="snapshot")
+        self.prerender_reports()
+
+    def unload(self):
+        with self.lock:
+            self._reset_data()
+            self._forget_webhook_order()
+
+    def _forget_webhook_order(self):
+        # The next full load supersedes every event ordered so far.
+        if self._webhook_processor is not None:
+            self._webhook_processor.reset()
+
+class TenantPool:
+    """Registry of tenants whose loaded data is kept within a global memory budget.
+
+    Data is loaded lazily on a tenant's first query. When the budget is exceeded, the
+    least recently used idle tenants are evicted, optionally spilling to an on-disk
+    snapshot that is reloaded instead of re-fetching from Monday.
+    """
+
+    def __init__(self, api_keys, memory_budget_bytes=512 * 1024 ** 2, snapshot_dir=None, snapshot_max_age=900, client_factory=MondayClient, tokens=None):
+        self.api_keys = dict(api_keys)
+        # Client API token -> tenant id: a client only ever reaches the tenant its token belongs to.
+        self.tokens = dict(tokens or {})
+        self.memory_budget_bytes = memory_budget_bytes
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_max_age = snapshot_max_age
+        self.client_factory = client_factory
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Tenants come from MONDAY_TENANTS ({"tenant_id": {"api_key": ..., "token": ...}, ...}).
+
+        MONDAY_API_KEY is the default tenant, whose clients authenticate with BI_API_TOKEN if it is set.
+        """
+        api_keys = {DEFAULT_TENANT: os.environ.get("MONDAY_API_KEY")}
+        tokens = {}
+        if os.environ.get("BI_API_TOKEN"):
+            tokens[os.environ["BI_API_TOKEN"]] = DEFAULT_TENANT
+        for tenant_id, config in json.loads(os.environ.get("MONDAY_TENANTS") or "{}").items():
+            if not isinstance(config, dict):
+                config = {"api_key": config}
+            api_keys[tenant_id] = config.get("api_key")
+            if config.get("token"):
+                if config["token"] in tokens:
+                    raise ValueError(f"Tenant '{tenant_id}' reuses another tenant's token.")
+                tokens[config["token"]] = tenant_id
+            elif tenant_id != DEFAULT_TENANT:
+                logger.warning(f"Tenant '{tenant_id}' has no token in MONDAY_TENANTS; no client can reach it.")
+        return cls(
+            api_keys,
+            tokens=tokens,
+            memory_budget_bytes=int(float(os.environ.get("TENANT_MEMORY_BUDGET_MB", 512)) * 1024 ** 2),
+            snapshot_dir=os.environ.get("TENANT_SNAPSHOT_DIR") or None,
+            snapshot_max_age=float(os.environ.get("TENANT_SNAPSHOT_MAX_AGE", 900)),
+        )
+
+    def tenant_for_token(self, token):
+        """The tenant a client's API token belongs to. Without a token, the default tenant, unless it has one."""
+        if token is None:
+            if DEFAULT_TENANT in self.tokens.values():
+                raise UnauthorizedError()
+            return DEFAULT_TENANT
+        tenant_id = None
+        for known, owner in self.tokens.items():
+            if hmac.compare_digest(known.encode(), token.encode()):
+                tenant_id = owner
+        if tenant_id is None:
+            raise UnauthorizedError()
+        return tenant_id
+
+    def get(self, tenant_id=None, touch=True):
+        """Look up a tenant; probes and webhooks pass touch=False so they don't count as use for eviction."""
+        tenant_id = tenant_id or DEFAULT_TENANT
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                if tenant_id not in self.api_keys or not TENANT_ID_PATTERN.match(tenant_id):
+                    raise UnknownTenantError(tenant_id)
+                tenant = self._tenants[tenant_id] = TenantState(tenant_id, self.client_factory(api_key=self.api_keys[tenant_id]))
+                if not touch:
+                    self._tenants.move_to_end(tenant_id, last=False)
+            if touch:
+                self._tenants.move_to_end(tenant_id)
+                tenant.last_used = time.monotonic()
+            return tenant
+
+    def tenants(self):
+        with self._lock:
+            return list(self._tenants.values())
+
+    @contextmanager
+    def use(self, tenant_id=None, load=True):
+        """Pin a tenant for the duration of a request so it is never evicted mid-answer."""
+        tenant = self.get(tenant_id)
+        with self._lock:
+            tenant.in_use += 1
+        try:
+            if load:
+                self.ensure_loaded(tenant)
+            yield tenant
+        finally:
+            with self._lock:
+                tenant.in_use -= 1
+            # Pinned tenants are skipped by eviction, so the budget may only be reachable now.
+            self.enforce_budget()
+
+    def ensure_loaded(self, tenant):
+        """Load a tenant's boards if needed; callers should hold a pin (see use()) while using them."""
+        # evict() holds the tenant lock from its decision until the data is gone, so under it a
+        # pinned tenant is either loaded and stays so, or unloaded and ours to reload.
+        with tenant.lock:
+            ready = tenant.loaded
+            record_cache("board_data", ready)
+            if not ready:
+                try:
+                    if not self._restore(tenant):
+                        tenant.refresh()
+                except Exception as e:
+                    tenant.load_error = str(e)
+                    raise
+                tenant.load_error = None
+        if not ready:
+            self.enforce_budget()
+
+    def _snapshot_path(self, tenant):
+        return os.path.join(self.snapshot_dir, f"{tenant.tenant_id}.pkl") if self.snapshot_dir else None
+
+    def _restore(self, tenant):
+        path = self._snapshot_path(tenant)
+        if not path or not os.path.exists(path):
+            return False
+        if time.time() - os.path.getmtime(path) > self.snapshot_max_age:
+            self.invalidate_snapshot(tenant)
+            return False
+        try:
+            tenant.restore(path)
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding unreadable snapshot for tenant '{tenant.tenant_id}': {e}")
+            self.invalidate_snapshot(tenant)
+            return False
+
+    def invalidate_snapshot(self, tenant):
+        """Drop a tenant's snapshot, e.g. when a webhook changed data we are not holding in memory."""
+        path = self._snapshot_path(tenant)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def total_memory(self):
+        return sum(t.memory_bytes for t in self.tenants() if t.loaded)
+
+    def enforce_budget(self):
+        total = self.total_memory()
+        if total <= self.memory_budget_bytes:
+            return
+        # Tenants are kept in least-recently-used order. The most recent loaded one stays even if it
+        # alone exceeds the budget: evicting it would only mean reloading it for the next query.
+        for tenant in [t for t in self.tenants() if t.loaded][:-1]:
+            if total <= self.memory_budget_bytes:
+                break
+            total -= self.evict(tenant)
+
+    def evict(self, tenant):
+        """Unload an idle tenant, spilling it to a snapshot if configured. Returns the bytes freed."""
+        with tenant.lock:
+            # Decided under the pool lock, which use() pins under, and the tenant lock, which
+            # ensure_loaded checks under: a request pinned from here on waits and reloads.
+            with self._lock:
+                if not tenant.loaded or tenant.in_use:
+                    return 0
+            freed = tenant.memory_bytes
+            path = self._snapshot_path(tenant)
+            if path:
+                try:
+                    tenant.snapshot(path)
+                except Exception as e:
+                    logger.warning(f"Could not snapshot tenant '{tenant.tenant_id}' before eviction: {e}")
+            tenant.unload()
+            tenant.evicted = True
+        TENANT_EVICTIONS.inc()
+        logger.info(f"Evicted tenant '{tenant.tenant_id}' to stay within the memory budget.")
+        return freed
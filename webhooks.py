@@ -0,0 +1,273 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+from bi_engine import BIEngine
+from data_cleaner import DataCleaner
+from metrics import REGISTRY, timed_stage
+from tenants import frame_memory, row_memory
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_EVENTS = REGISTRY.counter("monday_webhook_events_total", "Monday webhook events by type and outcome.", labels=("type", "result"))
+
+CREATE_EVENTS = {"create_pulse", "create_item"}
+UPDATE_EVENTS = {"update_column_value", "change_column_value", "change_status_column_value", "change_specific_column_value"}
+RENAME_EVENTS = {"update_name", "change_name"}
+DELETE_EVENTS = {"delete_pulse", "item_deleted", "archive_pulse", "item_archived"}
+
+# How far, in event time, a delivery may lag the newest event seen and still be ordered against it.
+ORDERING_WINDOW_SECONDS = float(os.environ.get("WEBHOOK_ORDERING_WINDOW", 3600))
+
+def column_text(value):
+    """Best-effort conversion of a webhook column value to the `text` Monday returns for that column.
+
+    Returns None when the shape is unknown so the caller can re-fetch the item instead of guessing.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    if not isinstance(value, dict):
+        return None
+    if "label" in value:
+        label = value["label"]
+        return (label.get("text") or "") if isinstance(label, dict) else str(label or "")
+    if "date" in value:
+        return " ".join(part for part in (value.get("date"), value.get("time")) if part)
+    if "chosenValues" in value:
+        return ", ".join(str(v.get("name", "")) for v in value["chosenValues"] or [])
+    for key in ("text", "value", "name"):
+        if key in value:
+            return "" if value[key] is None else str(value[key])
+    return None
+
+class _ResyncNeeded(Exception):
+    """Raised under the locks when an event needs an item fetched from Monday first."""
+
+def _event_time(event):
+    if event.get("changedAt") is not None:
+        return float(event["changedAt"])
+    trigger_time = event.get("triggerTime")
+    if trigger_time:
+        try:
+            return datetime.fromisoformat(trigger_time.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+class MondayWebhookProcessor:
+    """Applies Monday item events to the in-memory boards held by AppState.
+
+    Duplicate deliveries are dropped by trigger UUID. Out-of-order deliveries are
+    resolved per (item, column) by event time, where creates and re-syncs count as a
+    write to every column, and deletes leave a tombstone so a late update cannot
+    resurrect a deleted item. That ordering state only covers the last
+    `ordering_window` seconds of event time; older deliveries are dropped as stale.
+    """
+
+    def __init__(self, state, monday_client, dedupe_size=10_000, ordering_window=ORDERING_WINDOW_SECONDS):
+        self.state = state
+        self.client = monday_client
+        self.dedupe_size = dedupe_size
+        self.ordering_window = ordering_window
+        self._seen = OrderedDict()
+        self.reset()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget per-item ordering state, e.g. once a full load has superseded it. Call under the tenant lock."""
+        self._applied_at = {}
+        self._deleted_at = {}
+        self._latest = float("-inf")
+        self._horizon = float("-inf")
+        self._prune_at = self.dedupe_size
+
+    def handle(self, payload):
+        event = payload.get("event") or {}
+        event_type = event.get("type", "unknown")
+        # Items fetched from Monday for a re-sync, by (kind, item id). The fetch happens with no
+        # lock held, so a slow Monday call never stalls queries; the event is then re-checked and applied.
+        fetched = {}
+        while True:
+            with self._lock, self.state.lock:
+                try:
+                    result = self._handle(event, fetched)
+                    break
+                except _ResyncNeeded as e:
+                    kind, item_id = e.args
+            fetched[(kind, item_id)] = self.client.fetch_items([item_id])
+        WEBHOOK_EVENTS.inc(type=event_type, result=result)
+        return result
+
+    def _handle(self, event, fetched):
+        uuid = event.get("triggerUuid") or event.get("originalTriggerUuid")
+        if uuid and uuid in self._seen:
+            return "duplicate"
+
+        if self.state.bi_engine is None:
+            # Nothing loaded yet; the first full refresh will include this change.
+            return "not_loaded"
+
+        kind = self._board_kind(event.get("boardId"))
+        item_id = event.get("pulseId") or event.get("itemId")
+        if kind is None or item_id is None:
+            return "ignored"
+
+        result = self._apply(kind, str(item_id), event, _event_time(event), fetched)
+        if uuid:
+            self._seen[uuid] = True
+            if len(self._seen) > self.dedupe_size:
+                self._seen.popitem(last=False)
+        return result
+
+    def _board_kind(self, board_id):
+        for kind, known_id in self.state.board_ids.items():
+            if known_id is not None and str(known_id) == str(board_id):
+                return kind
+        return None
+
+    def _record(self, table, key, ts):
+        table[key] = ts
+        self._latest = max(self._latest, ts)
+        if len(self._applied_at) + len(self._deleted_at) > self._prune_at:
+            self._prune()
+
+    def _prune(self):
+        """Drop ordering state older than the window, so it stays bounded on a busy account."""
+        self._horizon = max(self._horizon, self._latest - self.ordering_window)
+        self._applied_at = {key: ts for key, ts in self._applied_at.items() if ts >= self._horizon}
+        self._deleted_at = {key: ts for key, ts in self._deleted_at.items() if ts >= self._horizon}
+        self._prune_at = max(self.dedupe_size, 2 * (len(self._applied_at) + len(self._deleted_at)))
+
+    def _is_stale(self, kind, item_id, column, ts):
+        # Anything older than the pruned state can no longer be ordered against it.
+        if ts < self._horizon or ts <= self._deleted_at.get((kind, item_id), float("-inf")):
+            return True
+        # Whole-row writes (creates and re-syncs) are recorded under "*" and supersede every column.
+        applied = max(self._applied_at.get((kind, item_id, column), float("-inf")),
+                      self._applied_at.get((kind, item_id, "*"), float("-inf")))
+        return ts < applied
+
+    def _apply(self, kind, item_id, event, ts, fetched):
+        event_type = event.get("type", "")
+        rows = self.state.rows[kind]
+
+        if event_type in DELETE_EVENTS:
+            if ts < self._horizon or ts <= self._deleted_at.get((kind, item_id), float("-inf")):
+                return "stale"
+            self._record(self._deleted_at, (kind, item_id), ts)
+            previous = rows.pop(item_id, None)
+            if previous is None:
+                return "ignored"
+            self._patch_frame(kind, item_id, None, previous)
+            return "applied"
+
+        if event_type in CREATE_EVENTS:
+            if item_id in rows:
+                # Already known from a later update or a full refresh.
+                return "duplicate"
+            if self._is_stale(kind, item_id, "*", ts):
+                return "stale"
+            row = self._row_from_create(kind, item_id, event, fetched)
+            if row is None:
+                return "ignored"
+            return self._upsert(kind, item_id, row, "*", ts)
+
+        if event_type in UPDATE_EVENTS or event_type in RENAME_EVENTS:
+            column = "name" if event_type in RENAME_EVENTS else event.get("columnId")
+            if self._is_stale(kind, item_id, column, ts):
+                return "stale"
+
+            title = "name" if event_type in RENAME_EVENTS else (event.get("columnTitle") or self.state.column_titles[kind].get(column))
+            text = column_text(event.get("value"))
+            if item_id not in rows or title is None or text is None:
+                # Update for an item we never saw, or a value we can't render: re-sync that one item.
+                row = self._fetch_row(kind, item_id, fetched)
+                if row is None:
+                    return "ignored"
+                return self._upsert(kind, item_id, row, "*", ts)
+
+            row = dict(rows[item_id])
+            row[title] = text
+            return self._upsert(kind, item_id, row, column, ts)
+
+        return "ignored"
+
+    def _row_from_create(self, kind, item_id, event, fetched):
+        column_values = event.get("columnValues")
+        if isinstance(column_values, dict):
+            row = {"id": item_id, "name": event.get("pulseName") or event.get("itemName") or ""}
+            titles = self.state.column_titles[kind]
+            for column_id, value in column_values.items():
+                title = titles.get(column_id)
+                text = column_text(value)
+                if title is None or text is None:
+                    return self._fetch_row(kind, item_id, fetched)
+                row[title] = text
+            return row
+        return self._fetch_row(kind, item_id, fetched) or {"id": item_id, "name": event.get("pulseName") or ""}
+
+    def _fetch_row(self, kind, item_id, fetched):
+        if (kind, item_id) not in fetched:
+            raise _ResyncNeeded(kind, item_id)
+        items = fetched[(kind, item_id)]
+        if not items:
+            logger.warning(f"Webhook re-sync of item {item_id} returned nothing.")
+            return None
+        return DataCleaner()._extract_column_dicts(items, self.state.column_titles[kind])[0]
+
+    def _upsert(self, kind, item_id, row, column, ts):
+        previous = self.state.rows[kind].get(item_id)
+        self.state.rows[kind][item_id] = row
+        self._record(self._applied_at, (kind, item_id, column), ts)
+        self._patch_frame(kind, item_id, row, previous)
+        return "applied"
+
+    @timed_stage("webhook_patch")
+    def _patch_frame(self, kind, item_id, row, previous=None):
+        """Re-clean one item into a patched copy of its board frame, then swap in the frame and a new cleaner and BI engine.
+
+        Queries read frames and engines without the tenant lock, so the live objects are never modified in place.
+        """
+        frame_attr = "deals_df" if kind == "deals" else "work_orders_df"
+        df = getattr(self.state, frame_attr)
+        replaced = df[df['id'] == item_id] if not df.empty else df
+
+        if row is None:
+            patch = replaced.iloc[0:0]
+            df = df[df['id'] != item_id].reset_index(drop=True)
+        else:
+            cleaner = DataCleaner()
+            cleaned = cleaner.clean_deals_rows([row]) if kind == "deals" else cleaner.clean_work_orders_rows([row])
+            patch = cleaned if df.empty else cleaned.reindex(columns=df.columns)
+            if df.empty:
+                df = cleaned
+            elif len(replaced):
+                df = df.copy()
+                for col in df.columns:
+                    df.at[replaced.index[0], col] = patch.at[0, col]
+            else:
+                df = pd.concat([df, patch], ignore_index=True)
+
+        # Keep the memory budget's estimate in step without re-measuring the whole board.
+        self.state.memory_bytes += (frame_memory(patch) - frame_memory(replaced)
+                                    + (row_memory(row) if row else 0) - (row_memory(previous) if previous else 0))
+        setattr(self.state, frame_attr, df)
+        # Engines and cleaners already handed out keep answering for the previous version.
+        data_cleaner = DataCleaner()
+        data_cleaner.refresh_stats(self.state.deals_df, self.state.work_orders_df)
+        self.state.bi_engine = BIEngine(self.state.deals_df, self.state.work_orders_df)
+        self.state.data_cleaner = data_cleaner
+        self.state.data_version += 1
+        self.state.schedule_prerender()